@@ -7,7 +7,7 @@ from random import getrandbits
 from structlog import get_logger
 from redis import Redis
 import lmdb
-from jdb.storage import db
+from jdb.storage import db, wal
 
 KEY_SIZE = 24
 VAL_SIZE = 8
@@ -46,9 +46,26 @@ def main():
         "-t", "--threads", type=int, help="number of clients", default=32
     )
 
+    parser.add_argument(
+        "-d", "--data-dir", type=str, help="jdb data dir, in memory if unset"
+    )
+
+    parser.add_argument(
+        "-m",
+        "--sync-mode",
+        type=str,
+        help="jdb wal sync mode",
+        choices=[mode.name for mode in wal.SyncMode],
+        default=wal.SyncMode.ALWAYS.name,
+    )
+
     args = parser.parse_args()
     redis = Redis(host="localhost", port=6379, db=0)
-    jdb = db.DB(compression=None)
+    jdb = db.DB(
+        compression=None,
+        data_dir=args.data_dir,
+        sync_mode=wal.SyncMode[args.sync_mode],
+    )
     lmdbenv = lmdb.open(
         path=path.join(DIRNAME, "../tmp"), map_size=jdb.memtable.max_size, lock=True
     )
@@ -85,6 +102,8 @@ def main():
         val_size=VAL_SIZE,
         key_size=KEY_SIZE,
         store=args.store,
+        data_dir=args.data_dir,
+        sync_mode=args.sync_mode,
     )
 
     batch_size = int(args.set_size / thread_count)
@@ -108,7 +127,8 @@ def main():
     _exec_threads(builder_threads)
     LOGGER.info("running")
     elapsed = timeit(lambda: _exec_threads(writer_threads), number=1)
-    LOGGER.info("done", elapsed=elapsed)
+    LOGGER.info("done", elapsed=elapsed, **jdb.stats().get("wal", {}))
+    jdb.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,78 @@
+from argparse import ArgumentParser
+from random import getrandbits, shuffle
+from timeit import timeit
+from structlog import get_logger
+from jdb.storage import memtable as mem, compression as cmp, entry as ent
+from jdb import util
+
+KEY_SIZE = 24
+VAL_SIZE = 8
+LOGGER = get_logger()
+CHOICES = {
+    "avl": mem.IndexType.AVL,
+    "skiplist": mem.IndexType.SKIPLIST,
+    "array": mem.IndexType.ARRAY,
+}
+
+
+def _keys(num: int):
+    """random fixed width versioned keys"""
+
+    return [
+        util.encode_key_with_ts(getrandbits(KEY_SIZE * 8).to_bytes(KEY_SIZE, "big"), 1)
+        for _ in range(num)
+    ]
+
+
+def main():
+    """fire it up"""
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-i",
+        "--index",
+        type=str,
+        nargs="+",
+        help="which indexes to run",
+        choices=list(CHOICES),
+        default=list(CHOICES),
+    )
+    parser.add_argument(
+        "-n", "--num", type=int, help="number of keys", default=1_000_000
+    )
+    parser.add_argument(
+        "-l", "--lookups", type=int, help="number of lookups", default=100_000
+    )
+    args = parser.parse_args()
+
+    keys = _keys(args.num)
+    val = bytes(bytearray([1] * VAL_SIZE))
+    encoded = [ent.Entry(key=key, value=val).encode() for key in keys]
+    size = sum(len(buf) for buf in encoded)
+    hits = keys[: args.lookups]
+    misses = _keys(args.lookups)
+    shuffle(hits)
+
+    for name in args.index:
+        table = mem.Memtable(
+            max_size=size, compression=cmp.Compression(None), index=CHOICES[name]
+        )
+        insert = timeit(
+            lambda: [table.put_encoded(k, buf) for k, buf in zip(keys, encoded)],
+            number=1,
+        )
+        get = timeit(lambda: [table.get(key) for key in hits], number=1)
+        gte = timeit(lambda: [table.get(key) for key in misses], number=1)
+        LOGGER.info(
+            "index",
+            index=name,
+            keys=args.num,
+            insert_us=insert * 1e6 / args.num,
+            get_us=get * 1e6 / args.lookups,
+            search_gte_us=gte * 1e6 / args.lookups,
+            bytes_per_key=table.index_size() / args.num,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from argparse import ArgumentParser
+from random import getrandbits, choice
+from timeit import timeit
+from structlog import get_logger
+from jdb.storage import memtable as mem, compression as cmp, entry as ent
+from jdb import util
+
+KEY_SIZE = 24
+LOGGER = get_logger()
+SIZES = [1 << 20, 10 << 20, 100 << 20, 1 << 30]
+
+
+def _fill(table: mem.Memtable, size: int, val_size: int):
+    """append random entries until the arena is size bytes, return the keys"""
+
+    keys = []
+    val = bytes(bytearray([1] * val_size))
+
+    while table.size() < size:
+        key = util.encode_key_with_ts(bytes(getrandbits(8) for _ in range(KEY_SIZE)), 1)
+        encoded = ent.Entry(key=key, value=val).encode()
+
+        if table.size() + len(encoded) > table.max_size:
+            break
+
+        table.put_encoded(key, encoded)
+        keys.append(key)
+
+    return keys
+
+
+def _tail_copy_get(table: mem.Memtable, key: bytes) -> bytes:
+    """reference - how get used to decode, copying the arena tail each time"""
+
+    _, offset = table._find_near(key)  # pylint: disable=protected-access
+    tail = table._arena[offset : table.size()]  # pylint: disable=protected-access
+    return ent.Entry.decode_at(tail, compression=table.compression)[0].value
+
+
+def main():
+    """fire it up"""
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--sizes",
+        type=int,
+        nargs="+",
+        help="arena sizes in bytes",
+        default=SIZES,
+    )
+    parser.add_argument(
+        "-v", "--val-size", type=int, help="value size in bytes", default=1024
+    )
+    parser.add_argument(
+        "-n", "--gets", type=int, help="number of gets per size", default=10000
+    )
+    parser.add_argument(
+        "-r",
+        "--reference",
+        action="store_true",
+        help="also time the old tail-copying decode",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        table = mem.Memtable(max_size=size, compression=cmp.Compression(None))
+        keys = _fill(table, size, args.val_size)
+        sample = [choice(keys) for _ in range(0, args.gets)]
+        elapsed = timeit(lambda: [table.get(k).value for k in sample], number=1)
+        result = {
+            "size": size,
+            "entries": len(keys),
+            "get_us": elapsed * 1e6 / args.gets,
+        }
+
+        if args.reference:
+            elapsed = timeit(
+                lambda: [_tail_copy_get(table, k) for k in sample], number=1
+            )
+            result["tail_copy_get_us"] = elapsed * 1e6 / args.gets
+
+        LOGGER.info("memtable.get", **result)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,7 @@ class Node:
             yield key, getattr(self, key)
 
         yield "membership", util.stringify_keys(dict(self.membership.cluster_state))
+        yield "store", self.store.stats()
 
     def __post_init__(self):
         """override"""
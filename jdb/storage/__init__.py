@@ -1,13 +1,21 @@
 from .db import DB
 from .transaction import Transaction, TransactionMeta, TransactionStatus
 from .avltree import AVLTree
-from .entry import Entry
+from .skiplist import SkipList
+from .entry import Entry, EntryView
+from .sstable import SSTable, SSTableWriter
+from .bloom import BloomFilter
 
 __all__ = [
     "DB",
     "Transaction",
     "AVLTree",
+    "SkipList",
     "Entry",
+    "EntryView",
+    "SSTable",
+    "SSTableWriter",
+    "BloomFilter",
     "TransactionMeta",
     "TransactionStatus",
 ]
@@ -0,0 +1,277 @@
+from typing import Callable, Generator, List, Optional, Tuple
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from sys import getsizeof
+from jdb import types
+
+BUFFER_SIZE = 256
+LEVEL_SIZE_RATIO = 8
+FENCE_INTERVAL = 8
+
+
+class Run:
+    """
+    sorted array of arena offsets, plus the key at every FENCE_INTERVAL'th one so
+    a search can bisect the fences in C and only decode a handful of keys
+    """
+
+    __slots__ = ("offsets", "fences")
+
+    def __init__(self, offsets: array, fences: List[types.Key]):
+        self.offsets = offsets
+        self.fences = fences
+
+    def __len__(self) -> int:
+        """number of offsets"""
+
+        return len(self.offsets)
+
+    @property
+    def nbytes(self) -> int:
+        """memory held by the offsets and fence keys"""
+
+        return (
+            self.offsets.itemsize * len(self.offsets)
+            + getsizeof(self.fences)
+            + sum(getsizeof(key) for key in self.fences)
+        )
+
+
+_EMPTY = Run(offsets=array("Q"), fences=[])
+
+_State = Tuple[List[types.IndexEntry], List[Run]]
+
+
+class ArrayIndex:
+    """
+    compact index. keys aren't stored - they're already in the arena, so a run is
+    just an array of 8 byte arena offsets sorted by the key found there (key_at).
+    inserts go to a small sorted buffer. when it fills up it gets merged into
+    level 0, and a level that outgrows its budget (LEVEL_SIZE_RATIO times the one
+    above) is merged into the next, so shallower runs are always newer. merges
+    build new runs and (buffer, runs) is swapped in with one store, so readers
+    never see a run mid-merge
+    """
+
+    def __init__(
+        self, key_at: Callable[[int], types.Key], buffer_size: int = BUFFER_SIZE
+    ):
+        self._key_at = key_at
+        self._buffer_size = buffer_size
+        self._state: _State = ([], [])
+
+    def __iter__(self) -> Generator[types.IndexEntry, None, None]:
+        """in order"""
+
+        return self.seek(None)
+
+    @property
+    def nbytes(self) -> int:
+        """memory held by the runs and buffer"""
+
+        buffer, runs = self._state
+        return (
+            sum(run.nbytes for run in runs)
+            + getsizeof(buffer)
+            + sum(getsizeof(entry) + getsizeof(entry[0]) for entry in buffer)
+        )
+
+    def search(
+        self, key: types.IndexEntry, gte: Optional[bool] = False
+    ) -> Optional[types.IndexEntry]:
+        """exact match, or if gte is true, the closest entry gte the search key"""
+
+        buffer, runs = self._state
+        best: Optional[types.IndexEntry] = None
+        i = bisect_left(buffer, (key[0],))
+
+        if i < len(buffer):
+            best = buffer[i]
+
+        for run in runs:
+            i = self._lower_bound(run, key[0])
+
+            if i == len(run):
+                continue
+
+            offset = run.offsets[i]
+            found = self._run_key(run, i)
+
+            if not best or found < best[0]:
+                best = (found, offset)
+
+        if best and (gte or best[0] == key[0]):
+            return best
+
+        return None
+
+    def seek(
+        self, key: Optional[types.IndexEntry], reverse: bool = False
+    ) -> Generator[types.IndexEntry, None, None]:
+        """
+        iterate from the first entry gte key, or if reverse, from the last entry
+        lte key towards the front. no key means from the start (or end). if a key
+        is in more than one run the newest one wins
+        """
+
+        buffer, runs = self._state
+        sign = -1 if reverse else 1
+        sources = [self._tagged_buffer(buffer, key, reverse)]
+        sources += [
+            self._tagged_run(
+                run, sign * (i + 1), self._start(run, key, reverse), reverse
+            )
+            for i, run in enumerate(runs)
+        ]
+        last: Optional[types.Key] = None
+
+        for found, _, offset in merge(*sources, reverse=reverse):
+            if found != last:
+                last = found
+                yield found, offset
+
+    def insert(self, key: types.IndexEntry) -> None:
+        """add to the buffer, replacing a buffered entry with the same key"""
+
+        buffer, runs = self._state
+        buffer = buffer[:]
+        i = bisect_left(buffer, (key[0],))
+
+        if i < len(buffer) and buffer[i][0] == key[0]:
+            buffer[i] = key
+        else:
+            buffer.insert(i, key)
+
+        if len(buffer) >= self._buffer_size:
+            runs = self._push(buffer, runs)
+            buffer = []
+
+        self._state = (buffer, runs)
+
+    def _push(self, buffer: List[types.IndexEntry], runs: List[Run]) -> List[Run]:
+        """merge the buffer into level 0, cascading down while levels overflow"""
+
+        runs = runs[:]
+        newer = ((key, 0, offset) for key, offset in buffer)
+        level = 0
+
+        while True:
+            if level == len(runs):
+                runs.append(_EMPTY)
+
+            run = self._merge(newer, runs[level])
+            budget = self._buffer_size * LEVEL_SIZE_RATIO ** (level + 1)
+
+            if len(run) <= budget:
+                runs[level] = run
+                return runs
+
+            runs[level] = _EMPTY
+            newer = self._tagged_run(run, 0, 0)
+            level += 1
+
+    def _merge(
+        self, newer: Generator[Tuple[types.Key, int, int], None, None], older: Run
+    ) -> Run:
+        """one run out of two sorted streams. dup keys keep the newer offset"""
+
+        offsets = array("Q")
+        fences: List[types.Key] = []
+        last: Optional[types.Key] = None
+
+        for key, _, offset in merge(newer, self._tagged_run(older, 1, 0)):
+            if key == last:
+                continue
+
+            last = key
+
+            if not len(offsets) % FENCE_INTERVAL:
+                fences.append(key)
+
+            offsets.append(offset)
+
+        return Run(offsets=offsets, fences=fences)
+
+    def _lower_bound(self, run: Run, key: types.Key) -> int:
+        """
+        index of the first offset in run whose key is gte key. the fences narrow
+        it down to one FENCE_INTERVAL wide window, then binary search that
+        """
+
+        fence = bisect_left(run.fences, key)
+
+        if not fence:
+            return 0
+
+        low = (fence - 1) * FENCE_INTERVAL + 1
+        high = min(fence * FENCE_INTERVAL, len(run))
+
+        while low < high:
+            mid = (low + high) // 2
+
+            if self._key_at(run.offsets[mid]) < key:
+                low = mid + 1
+            else:
+                high = mid
+
+        return low
+
+    def _run_key(self, run: Run, i: int) -> types.Key:
+        """key at index i, skipping the decode if it's a fence"""
+
+        if i % FENCE_INTERVAL:
+            return self._key_at(run.offsets[i])
+
+        return run.fences[i // FENCE_INTERVAL]
+
+    def _start(self, run: Run, key: Optional[types.IndexEntry], reverse: bool) -> int:
+        """where a seek starts in a run. -1 if reverse and nothing is lte key"""
+
+        if key is None:
+            return len(run) - 1 if reverse else 0
+
+        i = self._lower_bound(run, key[0])
+
+        if reverse and not (i < len(run) and self._run_key(run, i) == key[0]):
+            i -= 1
+
+        return i
+
+    def _tagged_run(
+        self, run: Run, priority: int, start: int, reverse: bool = False
+    ) -> Generator[Tuple[types.Key, int, int], None, None]:
+        """
+        (key, priority, offset) from start, so the newer of two equal keys comes
+        first. priorities are negated when going in reverse
+        """
+
+        key_at = self._key_at
+        offsets = run.offsets
+        indexes = range(start, -1, -1) if reverse else range(start, len(offsets))
+
+        for i in indexes:
+            offset = offsets[i]
+            yield key_at(offset), priority, offset
+
+    @classmethod
+    def _tagged_buffer(
+        cls,
+        buffer: List[types.IndexEntry],
+        key: Optional[types.IndexEntry],
+        reverse: bool,
+    ) -> Generator[Tuple[types.Key, int, int], None, None]:
+        """buffer is always the newest"""
+
+        if key is None:
+            i = len(buffer) if reverse else 0
+        else:
+            i = bisect_left(buffer, (key[0],))
+
+            if reverse and i < len(buffer) and buffer[i][0] == key[0]:
+                i += 1
+
+        entries = reversed(buffer[:i]) if reverse else buffer[i:]
+
+        for found, offset in entries:
+            yield found, 0, offset
@@ -1,29 +1,82 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional
+from typing import Generator, List, Optional
+from sys import getsizeof
 from jdb import types
 
 
-@dataclass
 class Node:
     """tree nodes"""
 
-    key: types.IndexEntry
-    left: Optional[Node] = None
-    right: Optional[Node] = None
-    maximum: Optional[Node] = None
-    height: int = 1
+    __slots__ = ("key", "left", "right", "height")
 
-    def __post_init__(self):
-        """override"""
+    def __init__(self, key: types.IndexEntry):
+        self.key = key
+        self.left: Optional[Node] = None
+        self.right: Optional[Node] = None
+        self.height = 1
 
-        self.maximum = self
+
+_NODE_BYTES = getsizeof(Node(key=(bytes(), 0)))
 
 
 class AVLTree:
     """avl tree implementation"""
 
-    root: Optional[Node] = None
+    def __init__(self):
+        self.root: Optional[Node] = None
+        self.nbytes = 0
+
+    def __iter__(self) -> Generator[types.IndexEntry, None, None]:
+        """in-order traversal"""
+
+        stack: List[Node] = []
+        node = self.root
+
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+
+            node = stack.pop()
+            yield node.key
+            node = node.right
+
+    def seek(
+        self, key: Optional[types.IndexEntry], reverse: bool = False
+    ) -> Generator[types.IndexEntry, None, None]:
+        """
+        iterate from the first entry gte key, or if reverse, from the last entry
+        lte key towards the front. no key means from the start (or end)
+        """
+
+        stack: List[Node] = []
+        node = self.root
+
+        while node:
+            cmp = 1
+
+            if key is not None:
+                cmp = self._compare(node.key, key) * (-1 if reverse else 1)
+
+            if cmp < 0:
+                node = node.left if reverse else node.right
+                continue
+
+            stack.append(node)
+
+            if cmp == 0:
+                break
+
+            node = node.right if reverse else node.left
+
+        while stack:
+            node = stack.pop()
+            yield node.key
+            child = node.left if reverse else node.right
+
+            while child:
+                stack.append(child)
+                child = child.right if reverse else child.left
 
     def search(
         self, key: types.IndexEntry, gte: Optional[bool] = False
@@ -36,30 +89,28 @@ class AVLTree:
         self, root: Optional[Node], key: types.IndexEntry, gte: Optional[bool] = False
     ) -> Optional[types.IndexEntry]:
         """
-        bst search. if gte is true, find exact match or closest node gte search key
+        bst search. if gte is true, find exact match or closest node gte search key.
+        the closest node is the last one we went left at on the way down
         """
 
-        if not root:
-            return None
+        candidate: Optional[Node] = None
+        node = root
 
-        cmp = self._compare(key, root.key)
+        while node:
+            cmp = self._compare(key, node.key)
 
-        if cmp < 0:
-            if gte and (
-                not root.left
-                or (
-                    self._compare(key, root.left.key) > 0
-                    and root.left.maximum
-                    and self._compare(key, root.left.maximum.key) > 0
-                )
-            ):
-                return root.key
+            if cmp == 0:
+                return node.key
+            if cmp < 0:
+                candidate = node
+                node = node.left
+            else:
+                node = node.right
 
-            return self._search(root.left, key, gte=gte)
-        if cmp > 0:
-            return self._search(root.right, key, gte=gte)
+        if gte and candidate:
+            return candidate.key
 
-        return root.key
+        return None
 
     def _compare(self, one: types.IndexEntry, other: types.IndexEntry) -> int:
         """simple comparator"""
@@ -72,26 +123,41 @@ class AVLTree:
         return 1
 
     def insert(self, key: types.IndexEntry) -> None:
-        """proxy to root node"""
+        """
+        bst insert, then walk back up the path rebalancing any node whose balance
+        factor hit +/- 2
+        """
 
-        node = Node(key=key)
-        self.root = self._insert(self.root, node)
+        path: List[Node] = []
+        node = self.root
 
-    def _insert(self, root: Optional[Node], node: Node) -> Node:
-        """bst insert then rebalance if balance factor +/- 2"""
+        while node:
+            cmp = self._compare(key, node.key)
 
-        if not root:
-            return node
+            if cmp == 0:
+                node.key = key
+                return
+
+            path.append(node)
+            node = node.left if cmp < 0 else node.right
+
+        child = Node(key=key)
+        self.nbytes += _NODE_BYTES + getsizeof(key) + getsizeof(key[0])
+
+        while path:
+            parent = path.pop()
+
+            if self._compare(key, parent.key) < 0:
+                parent.left = child
+            else:
+                parent.right = child
+
+            child = self._rebalance(parent, key)
 
-        cmp = self._compare(node.key, root.key)
+        self.root = child
 
-        if cmp == 0:
-            root.key = node.key
-        elif cmp < 0:
-            root.left = self._insert(root.left, node)
-        elif cmp > 0:
-            root.maximum = node
-            root.right = self._insert(root.right, node)
+    def _rebalance(self, root: Node, key: types.IndexEntry) -> Node:
+        """fix up height, rotate if key's insert unbalanced root"""
 
         lheight = self._getheight(root.left)
         rheight = self._getheight(root.right)
@@ -99,18 +165,14 @@ class AVLTree:
         balance = lheight - rheight
         result = root
 
-        if balance > 1 and root.left and self._compare(node.key, root.left.key) < 0:
+        if balance > 1 and root.left and self._compare(key, root.left.key) < 0:
             result = self._right_rotate(root)
-        elif (
-            balance < -1 and root.right and self._compare(node.key, root.right.key) > 0
-        ):
+        elif balance < -1 and root.right and self._compare(key, root.right.key) > 0:
             result = self._left_rotate(root)
-        elif balance > 1 and root.left and self._compare(node.key, root.left.key) > 0:
+        elif balance > 1 and root.left and self._compare(key, root.left.key) > 0:
             root.left = self._left_rotate(root.left)
             result = self._right_rotate(root)
-        elif (
-            balance < -1 and root.right and self._compare(node.key, root.right.key) < 0
-        ):
+        elif balance < -1 and root.right and self._compare(key, root.right.key) < 0:
             root.right = self._right_rotate(root.right)
             result = self._left_rotate(root)
 
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import List
+from math import log
+from xxhash import xxh64_intdigest
+
+_MAX_PROBES = 30
+
+
+class BloomFilter:
+    """
+    bloom filter over user keys. k probes are derived from one 64 bit hash with
+    double hashing (h1 + i * h2), so building and checking hash each key once.
+    --------------------------
+    | k | bit array ...     |
+    --------------------------
+    """
+
+    def __init__(self, bits: bytes, probes: int):
+        self._bits = bits
+        self._nbits = len(bits) * 8
+        self.probes = probes
+
+    @classmethod
+    def build(cls, hashes: List[int], bits_per_key: int) -> BloomFilter:
+        """filter for a set of key hashes (see hash)"""
+
+        probes = min(_MAX_PROBES, max(1, round(bits_per_key * log(2))))
+        nbits = max(64, len(hashes) * bits_per_key)
+        nbytes = (nbits + 7) // 8
+        nbits = nbytes * 8
+        bits = bytearray(nbytes)
+
+        for hsh in hashes:
+            for bit in cls._bits_for(hsh, probes, nbits):
+                bits[bit >> 3] |= 1 << (bit & 7)
+
+        return BloomFilter(bytes(bits), probes)
+
+    @classmethod
+    def decode(cls, buf: bytes) -> BloomFilter:
+        """inverse of encode"""
+
+        return BloomFilter(bytes(buf[1:]), buf[0])
+
+    @staticmethod
+    def hash(key: bytes) -> int:
+        """64 bit hash of a user key"""
+
+        return xxh64_intdigest(key)
+
+    def encode(self) -> bytes:
+        """byte array representation"""
+
+        return bytes([self.probes]) + self._bits
+
+    def may_contain(self, key: bytes) -> bool:
+        """false means the key is definitely not in the set"""
+
+        bits = self._bits
+
+        for bit in self._bits_for(self.hash(key), self.probes, self._nbits):
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        """size of the bit array"""
+
+        return len(self._bits)
+
+    @staticmethod
+    def _bits_for(hsh: int, probes: int, nbits: int):
+        """bit positions for a hash"""
+
+        lo, hi = hsh & 0xFFFFFFFF, hsh >> 32
+        return ((lo + i * hi) % nbits for i in range(0, probes))
@@ -0,0 +1,348 @@
+from __future__ import annotations
+from typing import Generator, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from heapq import merge
+from threading import Condition, Lock
+from time import monotonic, sleep
+from jdb.storage import entry as ent, sstable as sst
+from jdb import const, types, util
+
+if TYPE_CHECKING:
+    from jdb.storage.db import DB
+
+MAX_LEVELS = 7
+
+
+class RateLimiter:
+    """token bucket, bytes per second. threadsafe"""
+
+    def __init__(self, rate: Optional[int]):
+        self.rate = rate
+        self._tokens = float(rate or 0)
+        self._last = monotonic()
+        self._lock = Lock()
+
+    def request(self, size: int) -> None:
+        """block until size bytes worth of tokens are available"""
+
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                float(self.rate), self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            sleep(wait)
+
+
+@dataclass
+class LevelStats:
+    """io counters for a level"""
+
+    bytes_read: int = 0
+    bytes_written: int = 0
+    compactions: int = 0
+
+
+@dataclass
+class Compaction:
+    """unit of work - merge tables from one level into the next"""
+
+    level: int
+    inputs: List[sst.SSTable]
+    overlaps: List[sst.SSTable]
+    numbers: Set[int] = field(init=False)
+
+    def __post_init__(self):
+        """override"""
+
+        self.numbers = {table.number for table in self.inputs + self.overlaps}
+
+    @property
+    def output_level(self) -> int:
+        """where the merged tables go"""
+
+        return self.level + 1
+
+
+class Compactor:
+    """
+    leveled compaction. L0 holds flushed memtables which can overlap each other.
+    L1 and below are sorted runs of non-overlapping tables, each level allowed
+    level_size_ratio times the bytes of the one above it. a level over its budget
+    gets a table merged into the next level down. merging drops versions that no
+    live snapshot can see, and tombstones once there is nothing older beneath them
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        threads: int = 2,
+        rate_limit: Optional[int] = 64 << 20,
+        l0_trigger: int = 4,
+        base_level_size: int = 64 << 20,
+        level_size_ratio: int = 10,
+        table_size: int = 8 << 20,
+    ):
+        self.db = db
+        self.l0_trigger = l0_trigger
+        self.base_level_size = base_level_size
+        self.level_size_ratio = level_size_ratio
+        self.table_size = table_size
+        self.limiter = RateLimiter(rate_limit)
+        self.stats = [LevelStats() for _ in range(0, MAX_LEVELS)]
+        self._running: List[Compaction] = []
+        self._pointers: List[types.Key] = [bytes() for _ in range(0, MAX_LEVELS)]
+        self._cond = Condition()
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="DBCompaction")
+        self._stopped = False
+
+    def schedule(self) -> None:
+        """kick off as many non-conflicting compactions as are needed"""
+
+        with self._cond:
+            self._schedule()
+
+    def wait(self) -> None:
+        """block until there is nothing left to compact"""
+
+        with self._cond:
+            while self._running:
+                self._cond.wait()
+
+    def pick(self) -> Optional[Compaction]:
+        """
+        highest scoring level whose tables aren't already being compacted.
+        caller holds the lock
+        """
+
+        levels = self.db.levels
+        busy = set().union(*(c.numbers for c in self._running))
+        scores = sorted(
+            ((self.score(level), level) for level in range(0, MAX_LEVELS - 1)),
+            reverse=True,
+        )
+
+        for score, level in scores:
+            if score < 1:
+                break
+
+            inputs = self._pick_inputs(level, levels, busy)
+
+            if not inputs:
+                continue
+
+            smallest = min(table.smallest for table in inputs)
+            largest = max(table.largest for table in inputs)
+            overlaps = [
+                table
+                for table in levels[level + 1]
+                if table.overlaps(smallest, largest)
+            ]
+
+            if any(table.number in busy for table in overlaps):
+                continue
+
+            self._pointers[level] = largest
+            return Compaction(level=level, inputs=inputs, overlaps=overlaps)
+
+        return None
+
+    def score(self, level: int) -> float:
+        """how far over budget a level is. >= 1 needs compacting"""
+
+        tables = self.db.levels[level]
+
+        if level == 0:
+            return len(tables) / self.l0_trigger
+
+        budget = self.base_level_size * self.level_size_ratio ** (level - 1)
+        return sum(table.file_size for table in tables) / budget
+
+    def level_stats(self) -> List[dict]:
+        """per level files/bytes/write amplification for INFO"""
+
+        flushed = self.stats[0].bytes_written or 1
+        ret = []
+
+        for level, tables in enumerate(self.db.levels):
+            stats = self.stats[level]
+            ret.append(
+                {
+                    "level": level,
+                    "files": len(tables),
+                    "bytes": sum(table.file_size for table in tables),
+                    "score": round(self.score(level), 2),
+                    "bytes_read": stats.bytes_read,
+                    "bytes_written": stats.bytes_written,
+                    "compactions": stats.compactions,
+                    "write_amp": round(stats.bytes_written / flushed, 2),
+                }
+            )
+
+        return ret
+
+    def stop(self) -> None:
+        """finish running compactions, don't start new ones"""
+
+        with self._cond:
+            self._stopped = True
+
+        self._pool.shutdown(wait=True)
+
+    def _pick_inputs(
+        self, level: int, levels: List[List[sst.SSTable]], busy: Set[int]
+    ) -> List[sst.SSTable]:
+        """all of L0 (it overlaps itself), else the next table round robin"""
+
+        tables = levels[level]
+
+        if level == 0:
+            if any(table.number in busy for table in tables):
+                return []
+
+            return list(tables)
+
+        candidates = [t for t in tables if t.number not in busy]
+        after = [t for t in candidates if t.smallest > self._pointers[level]]
+
+        for table in after or candidates:
+            return [table]
+
+        return []
+
+    def _run(self, compaction: Compaction) -> None:
+        """merge, publish, clean up, and see if there's more to do"""
+
+        try:
+            outputs = self._merge(compaction)
+            self.db.install(compaction, outputs)
+            stats = self.stats[compaction.output_level]
+            stats.compactions += 1
+            stats.bytes_read += sum(
+                table.file_size for table in compaction.inputs + compaction.overlaps
+            )
+            stats.bytes_written += sum(table.file_size for table in outputs)
+        finally:
+            with self._cond:
+                self._running.remove(compaction)
+                self._schedule()
+                self._cond.notify_all()
+
+    def _schedule(self) -> None:
+        """caller holds the lock"""
+
+        while not self._stopped:
+            compaction = self.pick()
+
+            if not compaction:
+                return
+
+            self._running.append(compaction)
+            self._pool.submit(self._run, compaction)
+
+    def _merge(self, compaction: Compaction) -> List[sst.SSTable]:
+        """write the merged inputs out as new tables for the output level"""
+
+        watermark = self.db.oracle.oldest_read_ts()
+        sources = compaction.inputs + compaction.overlaps
+        merged = merge(*(self._tagged(table, i) for i, table in enumerate(sources)))
+        outputs: List[sst.SSTable] = []
+        writer: Optional[sst.SSTableWriter] = None
+        number = 0
+        written = 0
+
+        for key, encoded in self._live(merged, watermark, compaction.output_level):
+            if not writer:
+                number = self.db.allocate_file()
+                writer = self.db.table_writer(number)
+                written = 0
+
+            self.limiter.request(len(encoded))
+            writer.add(key, encoded)
+            written += len(encoded)
+
+            if written >= self.table_size:
+                outputs.append(self._finish(writer, number))
+                writer = None
+
+        if writer:
+            outputs.append(self._finish(writer, number))
+
+        return outputs
+
+    def _finish(self, writer: sst.SSTableWriter, number: int) -> sst.SSTable:
+        """seal an output table and open it for reading"""
+
+        writer.finish()
+        return self.db.open_table(number)
+
+    def _live(
+        self,
+        merged: Iterator[Tuple[types.Key, int, bytes]],
+        watermark: types.Timestamp,
+        output_level: int,
+    ) -> Generator[Tuple[types.Key, bytes], None, None]:
+        """
+        filter the merged stream. per user key, keep every version newer than the
+        watermark plus the newest one at or below it. that one can go too if it's
+        a tombstone and no deeper level could still hold an older version
+        """
+
+        last_key: Optional[types.Key] = None
+        last_userkey: Optional[types.Key] = None
+        shadowed = False
+
+        for key, _, encoded in merged:
+            if key == last_key:
+                continue
+
+            last_key = key
+            userkey, ts = util.decode_key_with_ts(key)
+
+            if userkey != last_userkey:
+                last_userkey = userkey
+                shadowed = False
+
+            if ts > watermark:
+                yield key, encoded
+                continue
+
+            if shadowed:
+                continue
+
+            shadowed = True
+            entry = ent.EntryView(encoded, compression=self.db.compression)
+
+            if entry.isdeleted and self._is_bottommost(userkey, output_level):
+                continue
+
+            yield key, encoded
+
+    def _is_bottommost(self, userkey: types.Key, output_level: int) -> bool:
+        """no level below output has a table that could contain this key"""
+
+        smallest = util.encode_key_with_ts(userkey, const.MAX_UINT_64)
+        largest = util.encode_key_with_ts(userkey, 0)
+
+        return not any(
+            table.overlaps(smallest, largest)
+            for tables in self.db.levels[output_level + 1 :]
+            for table in tables
+        )
+
+    @classmethod
+    def _tagged(
+        cls, table: sst.SSTable, priority: int
+    ) -> Generator[Tuple[types.Key, int, bytes], None, None]:
+        """tag entries with their source so the newer copy of a dup sorts first"""
+
+        for key, encoded in table.entries():
+            yield key, priority, encoded
@@ -1,17 +1,32 @@
-from typing import Optional, List
+from typing import Generator, Iterable, Optional, List, Tuple
+from bisect import bisect_left, bisect_right
+from heapq import merge
 from contextlib import contextmanager
+from dataclasses import asdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+import os
 from jdb.storage import (
     oracle as orc,
     entry as ent,
     memtable as mem,
     compression as cmp,
     transaction as txn,
+    sstable as sst,
+    compaction as cpt,
+    manifest as mft,
+    vacuum as vac,
+    wal,
 )
 from jdb import (
     const,
+    errors as err,
     types,
+    util,
 )
 
+_TABLE_SUFFIX = ".sst"
+
 
 class DB:
     """main db/storage entry point"""
@@ -20,10 +35,63 @@ class DB:
         self,
         max_table_size: int = 1024 << 20,
         compression: Optional[cmp.CompressionType] = cmp.CompressionType.SNAPPY,
+        data_dir: Optional[str] = None,
+        sync_mode: wal.SyncMode = wal.SyncMode.ALWAYS,
+        sync_interval_ms: int = 100,
+        compaction_threads: int = 2,
+        compaction_rate_limit: Optional[int] = 64 << 20,
+        l0_compaction_trigger: int = 4,
+        base_level_size: int = 64 << 20,
+        level_size_ratio: int = 10,
+        bloom_bits_per_key: int = 10,
+        index: mem.IndexType = mem.IndexType.AVL,
+        vacuum_interval_ms: Optional[int] = 1000,
+        vacuum_batch_size: int = 1024,
+        vacuum_min_bytes: int = 1 << 20,
     ):
         self.oracle = orc.Oracle()
-        self.memtable = mem.Memtable(
-            max_size=max_table_size, compression=cmp.Compression(compression)
+        self.max_table_size = max_table_size
+        self.compression = cmp.Compression(compression)
+        self.index = index
+        self.memtable = self.new_memtable()
+        self.immutables: List[mem.Memtable] = []
+        self.levels: List[List[sst.SSTable]] = [[] for _ in range(0, cpt.MAX_LEVELS)]
+        self.data_dir = data_dir
+        self.bloom_bits_per_key = bloom_bits_per_key
+        self.filter_skips = 0
+        self.wal: Optional[wal.WAL] = None
+        self.manifest: Optional[mft.Manifest] = None
+        self.compactor = cpt.Compactor(
+            db=self,
+            threads=compaction_threads,
+            rate_limit=compaction_rate_limit,
+            l0_trigger=l0_compaction_trigger,
+            base_level_size=base_level_size,
+            level_size_ratio=level_size_ratio,
+            table_size=min(max_table_size, 8 << 20),
+        )
+        self._lock = Lock()
+        self._flushes: List[Future] = []
+        self._flusher = ThreadPoolExecutor(1, thread_name_prefix="DBFlush")
+        self._next_file = 1
+
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+            self.manifest = mft.Manifest(data_dir)
+            self._load_tables()
+            self.wal = wal.WAL(
+                directory=data_dir,
+                sync_mode=sync_mode,
+                sync_interval_ms=sync_interval_ms,
+            )
+            self._replay()
+            self.compactor.schedule()
+
+        self.vacuum = vac.Vacuum(
+            db=self,
+            interval_ms=vacuum_interval_ms,
+            batch_size=vacuum_batch_size,
+            min_bytes=vacuum_min_bytes,
         )
 
     def get(self, key: bytes) -> bytes:
@@ -44,21 +112,414 @@ class DB:
         with self.transaction() as transaction:
             transaction.write(key=key, meta=const.BIT_TOMBSTONE)
 
-    def write(self, entries: List[ent.Entry]):
-        """called by transactions to submit their writes"""
+    def scan(
+        self,
+        start: Optional[types.Key] = None,
+        end: Optional[types.Key] = None,
+        prefix: Optional[types.Key] = None,
+        reverse: bool = False,
+        limit: Optional[int] = None,
+    ) -> Generator[Tuple[types.Key, types.Value], None, None]:
+        """main scan API if interfacing with db class directly"""
+
+        with self.transaction() as transaction:
+            yield from transaction.scan(
+                start=start, end=end, prefix=prefix, reverse=reverse, limit=limit
+            )
+
+    def write(
+        self, entries: List[ent.Entry], commit_ts: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        called by transactions to submit their writes. entries are encoded once and
+        the same bytes go to the log and the memtable. encoding happens before
+        taking the write lock, so concurrent commits compress in parallel. with a
+        commit ts, wait for every earlier commit to be applied first so the log
+        and memtable get them in commit order. if they don't fit, freeze the
+        memtable and hand it off to be flushed. returns the log sequence number to
+        pass to sync
+        """
+
+        encoded = [entry.encode(compression=self.compression) for entry in entries]
+        size = sum(len(buf) for buf in encoded)
+
+        if commit_ts is not None:
+            self.oracle.applied.wait_for(commit_ts - 1)
+
+        with self.oracle.write_lock:
+            if self.wal and self.memtable.size() + size > self.max_table_size:
+                self._rotate()
+
+            seq = None
+
+            if self.wal:
+                seq = self.wal.append(b"".join(encoded))
+
+            for entry, buf in zip(entries, encoded):
+                self.memtable.put_encoded(entry.key, buf)
+
+        return seq
+
+    def sync(self, seq: Optional[int]):
+        """wait for a write to be durable. group committed with other writers"""
+
+        if self.wal and seq:
+            self.wal.sync(seq)
+
+    def read(self, key: types.Key) -> Optional[ent.EntryView]:
+        """
+        called by transactions to read from the db. check the active memtable, then
+        frozen memtables, then tables, newest to oldest. each source returns the
+        closest version gte the seek key, so the first one that is a version of the
+        same user key is the newest visible one
+        """
+
+        userkey, _ = util.decode_key_with_ts(key)
+        sources = [self.memtable, *self.immutables, *self.levels[0]]
+        levels = self.levels[1:]
+
+        for level in levels:
+            i = bisect_left([table.largest for table in level], key)
+
+            if i < len(level):
+                sources.append(level[i])
+
+        for source in sources:
+            if isinstance(source, sst.SSTable) and not source.may_contain(userkey):
+                self.filter_skips += 1
+                continue
+
+            version = source.get(key)
+
+            if version and util.decode_key_with_ts(version.key)[0] == userkey:
+                return version
+
+        return None
+
+    def read_range(
+        self,
+        lower: Optional[types.Key],
+        upper: Optional[types.Key],
+        reverse: bool = False,
+    ) -> Generator[ent.EntryView, None, None]:
+        """
+        called by transactions to scan. every stored version with a key in
+        [lower, upper) in key order, or descending if reverse, merged across
+        memtables and tables. if two sources hold the same version the newer one
+        wins. lazy - sources are only read as far as the caller gets
+        """
+
+        memtables = [self.memtable, *self.immutables]
+        levels = self.levels
+        start = upper if reverse else lower
+        sources: List[Iterable[ent.EntryView]] = [
+            source.seek(start, reverse=reverse) for source in memtables + levels[0]
+        ]
+        sources += [
+            self._level_range(level, lower, upper, reverse) for level in levels[1:]
+        ]
+        sign = -1 if reverse else 1
+        tagged = [
+            ((entry.key, sign * i, entry) for entry in source)
+            for i, source in enumerate(sources)
+        ]
+        last: Optional[types.Key] = None
+
+        for key, _, entry in merge(*tagged, reverse=reverse):
+            if reverse and lower is not None and key < lower:
+                return
+            if not reverse and upper is not None and key >= upper:
+                return
+            if key == last or (reverse and upper is not None and key >= upper):
+                continue
+
+            last = key
+            yield entry
+
+    @property
+    def tables(self) -> List[sst.SSTable]:
+        """every live table, newest data first"""
+
+        return [table for level in self.levels for table in level]
+
+    def flush(self):
+        """freeze the active memtable and wait for all pending flushes"""
+
+        if not self.wal:
+            return
+
+        with self.oracle.write_lock:
+            if self.memtable.entries_count():
+                self._rotate()
+
+        for future in list(self._flushes):
+            future.result()
+
+    def install(self, compaction: cpt.Compaction, outputs: List[sst.SSTable]):
+        """swap a compaction's inputs for its outputs and delete the inputs"""
+
+        output_level = compaction.output_level
+
+        with self._lock:
+            levels = [list(level) for level in self.levels]
+            levels[compaction.level] = [
+                t
+                for t in levels[compaction.level]
+                if t.number not in compaction.numbers
+            ]
+            kept = [
+                t for t in levels[output_level] if t.number not in compaction.numbers
+            ]
+            levels[output_level] = sorted(kept + outputs, key=lambda t: t.smallest)
+            self._save_manifest(levels)
+            self.levels = levels
+
+        for table in compaction.inputs + compaction.overlaps:
+            os.remove(table.path)
+
+    def allocate_file(self) -> int:
+        """next file number"""
+
+        with self._lock:
+            number = self._next_file
+            self._next_file += 1
+            return number
+
+    def table_path(self, number: int) -> str:
+        """table file path"""
+
+        return os.path.join(self.data_dir or "", f"{number:06d}{_TABLE_SUFFIX}")
+
+    def table_writer(self, number: int) -> sst.SSTableWriter:
+        """writer for a new table with db settings"""
+
+        return sst.SSTableWriter(
+            self.table_path(number), bits_per_key=self.bloom_bits_per_key
+        )
+
+    def open_table(self, number: int) -> sst.SSTable:
+        """open a table file for reading"""
+
+        return sst.SSTable(
+            self.table_path(number), compression=self.compression, number=number
+        )
+
+    def close(self):
+        """flush and release files"""
+
+        self.vacuum.stop()
+        self._flusher.shutdown(wait=True)
+        self.compactor.stop()
+
+        if self.wal:
+            self.wal.close()
 
-        for entry in entries:
-            self.memtable.put(entry)
+        for table in self.tables:
+            table.close()
 
-    def read(self, key: types.Key) -> Optional[ent.Entry]:
-        """called by transactions to read from the db"""
+    def stats(self) -> dict:
+        """storage stats for INFO"""
 
-        return self.memtable.get(key)
+        stats = {
+            "memtable": {
+                "bytes": self.memtable.size(),
+                "entries": self.memtable.entries_count(),
+                "index": self.index.name,
+                "index_bytes": self.memtable.index_size(),
+                "index_bytes_per_key": round(
+                    self.memtable.index_size() / max(1, self.memtable.entries_count()),
+                    1,
+                ),
+            },
+            "immutables": len(self.immutables),
+            "levels": self.compactor.level_stats(),
+            "vacuum": asdict(self.vacuum.stats),
+            "oracle": self.oracle.stats(),
+            "filter_skips": self.filter_skips,
+            "filter_bytes": sum(
+                table.filter.nbytes for table in self.tables if table.filter
+            ),
+        }
+
+        if self.wal:
+            stats["wal"] = self.wal.stats()
+
+        return stats
 
     @contextmanager
     def transaction(self):
         """create/yield/commit transaction"""
 
         transaction = txn.Transaction(db=self)
-        yield transaction
-        transaction.commit()
+
+        try:
+            yield transaction
+            transaction.commit()
+        finally:
+            transaction.finish()
+
+    @classmethod
+    def _level_range(
+        cls,
+        level: List[sst.SSTable],
+        lower: Optional[types.Key],
+        upper: Optional[types.Key],
+        reverse: bool,
+    ) -> Generator[ent.EntryView, None, None]:
+        """
+        seek through a level's non-overlapping tables one after the other, only
+        opening the ones whose key range can hold part of [lower, upper)
+        """
+
+        if reverse:
+            i = len(level)
+
+            if upper is not None:
+                i = bisect_right([table.smallest for table in level], upper)
+
+            for table in reversed(level[:i]):
+                yield from table.seek(upper, reverse=True)
+
+            return
+
+        i = 0
+
+        if lower is not None:
+            i = bisect_left([table.largest for table in level], lower)
+
+        for table in level[i:]:
+            if upper is not None and table.smallest >= upper:
+                return
+
+            yield from table.seek(lower)
+
+    def new_memtable(self) -> mem.Memtable:
+        """empty memtable with db settings"""
+
+        return mem.Memtable(
+            max_size=self.max_table_size,
+            compression=self.compression,
+            index=self.index,
+        )
+
+    def _rotate(self):
+        """
+        freeze the active memtable and install a new one. called under the write
+        lock so nothing gets appended to the log while it switches segments. the
+        frozen table is visible to readers before the new one replaces it
+        """
+
+        if not self.wal:
+            raise err.TableOverflow()
+
+        memtable = self.new_memtable()
+        memtable.log_segment = self.wal.rotate()
+        self._freeze(self.memtable)
+        self.memtable = memtable
+
+    def _freeze(self, frozen: mem.Memtable):
+        """make a memtable immutable and schedule it to be flushed"""
+
+        with self._lock:
+            self.immutables = [frozen, *self.immutables]
+            self._flushes.append(self._flusher.submit(self._flush, frozen))
+
+    def _flush(self, frozen: mem.Memtable):
+        """
+        background job - write a frozen memtable out to a table, publish the table,
+        then drop the memtable and its log segment
+        """
+
+        number = self.allocate_file()
+        writer = self.table_writer(number)
+
+        try:
+            for key, encoded in frozen.entries():
+                writer.add(key, encoded)
+
+            writer.finish()
+        except BaseException:
+            writer.abort()
+            raise
+
+        table = self.open_table(number)
+
+        with self._lock:
+            levels = [list(level) for level in self.levels]
+            levels[0].insert(0, table)
+            self._save_manifest(levels)
+            self.levels = levels
+            self.immutables = [m for m in self.immutables if m is not frozen]
+            self._flushes = [f for f in self._flushes if not f.done()]
+
+        self.compactor.stats[0].bytes_written += table.file_size
+
+        if self.wal and frozen.log_segment is not None:
+            self.wal.remove(frozen.log_segment)
+
+        self.compactor.schedule()
+
+    def _save_manifest(self, levels: List[List[sst.SSTable]]):
+        """persist the table layout. caller holds the lock"""
+
+        if self.manifest:
+            numbers = [[table.number for table in level] for level in levels]
+            self.manifest.save(numbers, self._next_file)
+
+    def _load_tables(self):
+        """
+        open the tables listed in the manifest and move the clock past them.
+        anything else on disk is a leftover from an interrupted flush/compaction
+        """
+
+        if not self.data_dir or not self.manifest:
+            return
+
+        if self.manifest.exists:
+            self.manifest.load()
+            self._next_file = self.manifest.next_file
+
+        live = {number for level in self.manifest.levels for number in level}
+
+        for name in os.listdir(self.data_dir):
+            if (
+                name.endswith(_TABLE_SUFFIX)
+                and int(name[: -len(_TABLE_SUFFIX)]) not in live
+            ):
+                os.remove(os.path.join(self.data_dir, name))
+
+        for level, numbers in enumerate(self.manifest.levels):
+            self.levels[level] = [self.open_table(number) for number in numbers]
+
+        for table in self.tables:
+            self.oracle.advance(table.max_ts)
+
+    def _replay(self):
+        """
+        rebuild memtables and the oracle clock from the log. every segment but the
+        current one belongs to a memtable that was frozen but never flushed
+        """
+
+        if not self.wal:
+            return
+
+        max_ts = 0
+
+        for segment in self.wal.segments():
+            memtable = self.new_memtable()
+            memtable.log_segment = segment
+
+            for payload in self.wal.replay(segment):
+                for buf in ent.split(payload):
+                    entry = ent.Entry.decode(buf, compression=self.compression)
+                    memtable.put_encoded(entry.key, buf)
+                    _, ts = util.decode_key_with_ts(entry.key)
+                    max_ts = max(max_ts, ts)
+
+            if segment == self.wal.segment:
+                self.memtable = memtable
+            else:
+                self._freeze(memtable)
+
+        self.memtable.log_segment = self.wal.segment
+        self.oracle.advance(max_ts)
@@ -1,11 +1,13 @@
 from __future__ import annotations
-from typing import Optional
+from typing import Optional, Generator, Tuple, Union
 from binascii import crc32
 from dataclasses import dataclass
 import uvarint
 from jdb.storage import compression as cmp
 from jdb import errors as err, const, types
 
+Buffer = Union[bytes, bytearray, memoryview]
+
 
 @dataclass
 class Entry:
@@ -16,35 +18,28 @@ class Entry:
     meta: int = 0
 
     @classmethod
-    def decode(cls, buf: bytes, compression: Optional[cmp.Compression] = None) -> Entry:
-        """
-        1. decode header
-        2. use header metadata to decode body
-        3. verify checksum, raise if mismatch
-        4. return object
-        """
-
-        decoded = uvarint.cut(4, buf)
-        body = decoded.rest
-        _, meta, keylen, valuelen = decoded.integers
-        key = bytes(body[0:keylen])
-        value = bytes(body[keylen : keylen + valuelen])
+    def decode(
+        cls, buf: Buffer, compression: Optional[cmp.Compression] = None
+    ) -> Entry:
+        """decode a buffer holding exactly one entry"""
 
-        checksum_bytes = body[keylen + valuelen :]
-        checksum = uvarint.decode(checksum_bytes).integer
-        header = cls._encode_header(key=key, value=value, meta=meta)
-        check = crc32(header)
-        check = crc32(key, check)
-        check = crc32(value, check)
+        entry, _ = cls.decode_at(buf, 0, compression=compression)
+        return entry
 
-        if checksum != check:
-            raise err.ChecksumMismatch()
-
-        if compression and compression.isenabled:
-            key = compression.decompress(key)
-            value = compression.decompress(value)
+    @classmethod
+    def decode_at(
+        cls,
+        buf: Buffer,
+        offset: int = 0,
+        compression: Optional[cmp.Compression] = None,
+    ) -> Tuple[Entry, int]:
+        """
+        decode the entry starting at offset and copy out key and value.
+        return the entry and the offset past it
+        """
 
-        return Entry(key=key, value=value, meta=meta)
+        view = EntryView(buf, offset, compression=compression)
+        return view.materialize(), view.end
 
     @property
     def isdeleted(self) -> bool:
@@ -95,3 +90,136 @@ class Entry:
             header += uvarint.encode(val)
 
         return header
+
+
+class EntryView:
+    """
+    an entry decoded in place. buf can be bytes, a bytearray, a memoryview or an
+    mmap. the header is parsed and the checksum verified over the header + body
+    bytes as stored, without copying anything. key and value are only copied
+    out (and decompressed) when they are accessed
+    1. decode header
+    2. use header metadata to find body
+    3. verify checksum, raise if mismatch
+    """
+
+    __slots__ = (
+        "meta",
+        "end",
+        "_buf",
+        "_key",
+        "_key_start",
+        "_value_start",
+        "_value_end",
+        "_compression",
+    )
+
+    def __init__(
+        self,
+        buf: Buffer,
+        offset: int = 0,
+        compression: Optional[cmp.Compression] = None,
+        key: Optional[types.Key] = None,
+    ):
+        block_size, start = read_uvarint(buf, offset)
+        keylen, pos = read_uvarint(buf, start + 1)
+        valuelen, key_start = read_uvarint(buf, pos)
+        value_start = key_start + keylen
+        value_end = value_start + valuelen
+        checksum, _ = read_uvarint(buf, value_end)
+
+        if checksum != crc32(buf[start:value_end]):
+            raise err.ChecksumMismatch()
+
+        self.meta = buf[start]
+        self.end = start + block_size
+        self._buf = buf
+        self._key = key
+        self._key_start = key_start
+        self._value_start = value_start
+        self._value_end = value_end
+        self._compression = compression
+
+    @property
+    def key(self) -> types.Key:
+        """decoded key. the caller may already know it (e.g. from an index)"""
+
+        if self._key is None:
+            self._key = self._decompress(self._buf[self._key_start : self._value_start])
+
+        return self._key
+
+    @property
+    def value(self) -> types.Value:
+        """decoded value"""
+
+        return self._decompress(self._buf[self._value_start : self._value_end])
+
+    @property
+    def isdeleted(self) -> bool:
+        """return true if tombstone bit is set"""
+
+        return self.meta & const.BIT_TOMBSTONE == 1
+
+    def materialize(self) -> Entry:
+        """copy into a standalone entry"""
+
+        return Entry(key=self.key, value=self.value, meta=self.meta)
+
+    def _decompress(self, buf: Buffer) -> bytes:
+        """copy out of the buffer, decompressing if needed"""
+
+        if self._compression and self._compression.isenabled:
+            return self._compression.decompress(buf)
+
+        return bytes(buf)
+
+
+def read_uvarint(buf: Buffer, offset: int) -> Tuple[int, int]:
+    """decode a uvarint in place. returns the value and the offset past it"""
+
+    value = 0
+    shift = 0
+
+    while True:
+        byte = buf[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+
+        if not byte & 0x80:
+            return value, offset
+
+        shift += 7
+
+
+def key_at(
+    buf: Buffer, offset: int, compression: Optional[cmp.Compression] = None
+) -> types.Key:
+    """key of the entry starting at offset, without touching the value or checksum"""
+
+    _, start = read_uvarint(buf, offset)
+    keylen = buf[start + 1]
+    pos = start + 2
+
+    if keylen & 0x80:
+        keylen, pos = read_uvarint(buf, start + 1)
+
+    _, key_start = read_uvarint(buf, pos)
+    key = buf[key_start : key_start + keylen]
+
+    if compression and compression.isenabled:
+        return compression.decompress(key)
+
+    return bytes(key)
+
+
+def split(buf: Buffer) -> Generator[Buffer, None, None]:
+    """split a buffer of back-to-back encoded entries into individual entries"""
+
+    offset = 0
+
+    while offset < len(buf):
+        block_size, start = read_uvarint(buf, offset)
+        end = start + block_size
+        yield buf[offset:end]
+        offset = end
@@ -0,0 +1,46 @@
+from typing import List
+import json
+import os
+
+FILENAME = "MANIFEST"
+
+
+class Manifest:
+    """
+    which table files make up which level. rewritten in full and atomically
+    swapped in every time the set of live tables changes
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, FILENAME)
+        self.levels: List[List[int]] = []
+        self.next_file = 1
+
+    @property
+    def exists(self) -> bool:
+        """has one been written yet"""
+
+        return os.path.exists(self.path)
+
+    def load(self) -> None:
+        """read from disk"""
+
+        with open(self.path, "r") as file:
+            state = json.load(file)
+
+        self.levels = state["levels"]
+        self.next_file = state["next_file"]
+
+    def save(self, levels: List[List[int]], next_file: int) -> None:
+        """write to disk"""
+
+        self.levels = levels
+        self.next_file = next_file
+        tmp_path = f"{self.path}.tmp"
+
+        with open(tmp_path, "w") as file:
+            json.dump({"levels": levels, "next_file": next_file}, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_path, self.path)
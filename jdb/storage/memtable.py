@@ -1,82 +1,188 @@
-from typing import Generator, Tuple, Optional
-from math import ceil
-import uvarint
-from jdb.storage import entry as ent, avltree as avl, compression as cmp
+from typing import Generator, List, Tuple, Optional, Union
+from enum import Enum
+import mmap
+from jdb.storage import (
+    entry as ent,
+    avltree as avl,
+    skiplist as skl,
+    arrayindex as arr,
+    compression as cmp,
+)
 from jdb import errors as err, types
 
+_ARENA_FLAGS = mmap.MAP_PRIVATE | getattr(mmap, "MAP_NORESERVE", 0)
+
+Index = Union[avl.AVLTree, skl.SkipList, arr.ArrayIndex]
+
+
+class IndexType(Enum):
+    """
+    which structure maps keys to arena offsets. the skiplist can be read while it's
+    being written to without any locking. the array index only keeps offsets, for
+    big memtables where a node per key would cost more than the data
+    """
+
+    AVL = 1
+    SKIPLIST = 2
+    ARRAY = 3
 
-class Memtable:
-    """in memory representation of db"""
 
-    def __init__(self, max_size: int, compression: cmp.Compression):
+class Memtable:
+    """
+    in memory representation of db. the arena is an anonymous mapping sized to
+    max_size up front - pages only get backed as they're written to, and since it
+    never moves, readers can decode straight out of memoryview slices of it
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        compression: cmp.Compression,
+        index: IndexType = IndexType.AVL,
+    ):
         self.max_size = max_size
-        self._compression = compression
-        self._arena = bytearray()
+        self.compression = compression
+        self._arena = mmap.mmap(-1, max(max_size, 1), flags=_ARENA_FLAGS)
+        self._view = memoryview(self._arena)
         self._entries_count = 0
         self._offset = 0
-        self._index = avl.AVLTree()
+        self._index = self._new_index(index)
+        self.log_segment: Optional[int] = None
 
     def put(self, entry: ent.Entry) -> None:
         """append an entry to the log"""
 
-        encoded = entry.encode(compression=self._compression)
+        self.put_encoded(entry.key, entry.encode(compression=self.compression))
+
+    def put_encoded(self, key: types.Key, encoded: bytes) -> None:
+        """
+        append an entry that has already been encoded with this table's settings.
+        bytes land in the arena before the index points at them
+        """
+
         size = len(encoded)
+        offset = self._offset
 
-        if self.size() + size > self.max_size:
+        if offset + size > self.max_size:
             raise err.TableOverflow()
 
-        self._index.insert((entry.key, self._offset))
-        self._arena += encoded
-        self._entries_count += 1
+        self._arena[offset : offset + size] = encoded
         self._offset += size
+        self._entries_count += 1
+        self._index.insert((key, offset))
 
-    def get(self, key: types.Key) -> Optional[ent.Entry]:
-        """find key and pointer in index, lookup value"""
+    def get(self, key: types.Key) -> Optional[ent.EntryView]:
+        """find key and pointer in index, decode in place"""
 
         val = self._find_near(key)
 
         if not val:
             return None
 
-        offset = val[1]
-        entry, _ = self._decode_at_offset(offset)
-        return entry
+        found, offset = val
+        return ent.EntryView(self._view, offset, self.compression, key=found)
 
     def size(self) -> int:
         """byte length of storage"""
 
-        return len(self._arena)
+        return self._offset
 
     def entries_count(self) -> int:
         """number of entries in db"""
 
         return self._entries_count
 
-    def scan(self) -> Generator[ent.Entry, None, None]:
+    def index_size(self) -> int:
+        """approximate bytes of memory held by the index"""
+
+        return self._index.nbytes
+
+    def scan(self) -> Generator[ent.EntryView, None, None]:
         """scan through log"""
 
         offset = 0
 
-        while offset < len(self._arena):
-            entry, bytes_read = self._decode_at_offset(offset)
+        while offset < self._offset:
+            entry = ent.EntryView(self._view, offset, self.compression)
             yield entry
-            offset = offset + bytes_read
+            offset = entry.end
+
+    def seek(
+        self, key: Optional[types.Key], reverse: bool = False
+    ) -> Generator[ent.EntryView, None, None]:
+        """
+        entries in key order from the first key gte key, or if reverse, descending
+        from the last key lte key. no key means from the start (or end)
+        """
+
+        start = None if key is None else (key, 0)
+
+        for found, offset in self._index.seek(start, reverse=reverse):
+            yield ent.EntryView(self._view, offset, self.compression, key=found)
+
+    def index_entries(
+        self, after: Optional[types.Key], limit: int
+    ) -> List[types.IndexEntry]:
+        """up to limit (key, offset) pairs in key order, starting past after"""
+
+        ret: List[types.IndexEntry] = []
+
+        for key, offset in self._index.seek(None if after is None else (after, 0)):
+            if key == after:
+                continue
+
+            ret.append((key, offset))
+
+            if len(ret) == limit:
+                break
+
+        return ret
+
+    def encoded_at(self, offset: types.Offset) -> ent.Buffer:
+        """the encoded entry starting at offset"""
+
+        return self._view[offset : self._block_end(offset)]
+
+    def tail(
+        self, offset: types.Offset, end: Optional[types.Offset] = None
+    ) -> Generator[Tuple[types.Key, ent.Buffer], None, None]:
+        """(key, encoded entry) for everything appended from offset on, in log order"""
+
+        end = self._offset if end is None else end
+
+        while offset < end:
+            buf = self.encoded_at(offset)
+            yield ent.EntryView(buf, compression=self.compression).key, buf
+            offset += len(buf)
+
+    def entries(self) -> Generator[Tuple[types.Key, ent.Buffer], None, None]:
+        """(key, encoded entry) in key order"""
+
+        for key, offset in self._index:
+            yield key, self._view[offset : self._block_end(offset)]
+
+    def _new_index(self, index: IndexType) -> Index:
+        """empty index of the given type"""
+
+        if index == IndexType.SKIPLIST:
+            return skl.SkipList()
+        if index == IndexType.ARRAY:
+            return arr.ArrayIndex(key_at=self._key_at)
+
+        return avl.AVLTree()
+
+    def _key_at(self, offset: types.Offset) -> types.Key:
+        """key of the entry starting at offset"""
+
+        return ent.key_at(self._view, offset, self.compression)
 
     def _find_near(self, key: types.Key) -> Optional[types.IndexEntry]:
         """find the closest version of this key"""
 
         return self._index.search((key, 0), gte=True)
 
-    def _decode_at_offset(self, offset: types.Offset) -> Tuple[ent.Entry, int]:
-        """
-        given an offset, return the entry starting there
-        and the byte length of the entry
-        """
-
-        block_size = uvarint.cut(1, self._arena[offset:]).integers[0]
-        block_end = offset + block_size + ceil(block_size.bit_length() / 8)
-        bytes_read = block_end - offset
-        chunk = self._arena[offset:block_end]
-        decoded = ent.Entry.decode(chunk, compression=self._compression)
+    def _block_end(self, offset: types.Offset) -> int:
+        """end offset of the entry starting at offset"""
 
-        return (decoded, bytes_read)
+        block_size, start = ent.read_uvarint(self._view, offset)
+        return start + block_size
@@ -1,35 +1,162 @@
-from threading import Lock
+from typing import Deque, Dict, List, Set, Tuple
+from collections import deque
+from threading import Condition, Lock
 from jdb import errors as err, const
 
+PRUNE_BATCH = 8
+
+
+class Watermark:
+    """
+    timestamps begin in order but can be done out of order. done_until is the
+    highest one with everything at or below it done (see badger's WaterMark)
+    """
+
+    def __init__(self, done_until: int = 0):
+        self._done_until = done_until
+        self._begun: Deque[int] = deque()
+        self._done: Set[int] = set()
+        self._cond = Condition()
+
+    @property
+    def done_until(self) -> int:
+        """everything at or below this is done"""
+
+        return self._done_until
+
+    def begin(self, ts: int) -> None:
+        """start tracking ts. must be called in increasing ts order"""
+
+        with self._cond:
+            self._begun.append(ts)
+
+    def done(self, ts: int) -> None:
+        """mark ts done and move done_until up past anything now contiguous"""
+
+        with self._cond:
+            self._done.add(ts)
+            begun = self._begun
+
+            while begun and begun[0] in self._done:
+                self._done.remove(begun[0])
+                self._done_until = begun.popleft()
+
+            self._cond.notify_all()
+
+    def advance(self, ts: int) -> None:
+        """everything up to ts is done, e.g. after replaying a log"""
+
+        with self._cond:
+            self._done_until = max(self._done_until, ts)
+            self._cond.notify_all()
+
+    def wait_for(self, ts: int) -> None:
+        """block until everything at or below ts is done"""
+
+        if self._done_until >= ts:
+            return
+
+        with self._cond:
+            self._cond.wait_for(lambda: self._done_until >= ts)
+
 
 class Oracle:
     """
     transaction status oracle.
     enforce isolation levels and maintain ordering of transactions.
-    transactions aren't threadsafe but the operations in this class must be
+    transactions aren't threadsafe but the operations in this class must be.
+    commits at or below the oldest live read ts can't conflict with anything any
+    more, so every commit request also sweeps a few of the oldest ones out of
+    the conflict table.
+    only conflict checking and handing out commit timestamps is serialized here.
+    commits then encode concurrently and apply in commit ts order, marking their
+    ts in applied when done. a new transaction's snapshot waits for applied to
+    catch up to it, so it never sees a later commit without an earlier one
     """
 
     def __init__(self):
         self._next_ts = 1
-        self._commits = {}
+        self._commits: Dict[bytes, int] = {}
+        self._history: Deque[Tuple[int, List[bytes]]] = deque()
+        self._pruned = 0
+        self._pending: Dict[int, int] = {}
         self._lock = Lock()
         self.write_lock = Lock()
+        self.applied = Watermark()
 
     def read_ts(self) -> int:
         """
         if a transaction gets a commit timestamp of 1
-        then its snapshot of the db includes everything that occurred until 0
+        then its snapshot of the db includes everything that occurred until 0.
+        waits for commits up to it to be applied
         """
 
         with self._lock:
-            return self._next_ts - 1
+            read_ts = self._next_ts - 1
+
+        self.applied.wait_for(read_ts)
+        return read_ts
+
+    def begin(self) -> int:
+        """
+        hand out a read ts for a new transaction and track it as live until
+        finish is called, so nothing it can still see gets cleaned up
+        """
+
+        with self._lock:
+            read_ts = self._next_ts - 1
+            self._pending[read_ts] = self._pending.get(read_ts, 0) + 1
+
+        self.applied.wait_for(read_ts)
+        return read_ts
+
+    def finish(self, read_ts: int) -> None:
+        """transaction with this read ts is done"""
+
+        with self._lock:
+            count = self._pending.get(read_ts, 0) - 1
+
+            if count > 0:
+                self._pending[read_ts] = count
+            else:
+                self._pending.pop(read_ts, None)
+
+    def oldest_read_ts(self) -> int:
+        """
+        low watermark - the oldest snapshot any live transaction can read from.
+        versions shadowed as of this ts are invisible to everyone
+        """
+
+        with self._lock:
+            return self._oldest_read_ts()
+
+    def advance(self, ts: int) -> None:
+        """make sure future timestamps come after ts, e.g. after replaying a log"""
+
+        with self._lock:
+            self._next_ts = max(self._next_ts, ts + 1)
+            self.applied.advance(self._next_ts - 1)
+
+    def stats(self) -> dict:
+        """conflict table size for INFO"""
+
+        with self._lock:
+            return {
+                "conflict_keys": len(self._commits),
+                "conflict_commits": len(self._history),
+                "pruned": self._pruned,
+                "pending": sum(self._pending.values()),
+                "applied_ts": self.applied.done_until,
+                "applying": self._next_ts - 1 - self.applied.done_until,
+            }
 
     def commit_request(self, txn) -> int:
         """
         per ssi - abort transaction if there are any writes that have occurred since
-        this transaction started that affect keys read by this transaction, then keep
-        track of this transaction's writes for other transactions to do the same.
-        threadsafe
+        this transaction started that affect keys read by this transaction, or land
+        in ranges it scanned, then keep track of this transaction's writes for other
+        transactions to do the same. threadsafe. the returned ts has to be
+        marked done in applied once the writes are in (or given up on)
         """
 
         with self._lock:
@@ -44,13 +171,62 @@ class Oracle:
             if last_commit and last_commit > txn.read_ts:
                 raise err.Abort()
 
+        for scanned in txn.scans:
+            if self._written_since(txn.read_ts, scanned):
+                raise err.Abort()
+
         ts = self._next_ts
         self._next_ts += 1
 
         if ts == const.MAX_UINT_64:
             raise OverflowError()
 
-        for key in txn.writes.keys():
+        keys = list(txn.writes.keys())
+
+        for key in keys:
             self._commits[key] = ts
 
+        self._history.append((ts, keys))
+        self.applied.begin(ts)
+        self._prune(PRUNE_BATCH)
         return ts
+
+    def _prune(self, budget: int) -> None:
+        """
+        forget up to budget of the oldest commits no live transaction can conflict
+        with. a key is only dropped if nothing wrote it since. not threadsafe
+        """
+
+        watermark = self._oldest_read_ts()
+        history = self._history
+
+        while budget and history and history[0][0] <= watermark:
+            ts, keys = history.popleft()
+            budget -= 1
+
+            for key in keys:
+                if self._commits.get(key) == ts:
+                    del self._commits[key]
+                    self._pruned += 1
+
+    def _oldest_read_ts(self) -> int:
+        """not threadsafe"""
+
+        if self._pending:
+            return min(self._pending)
+
+        return self._next_ts - 1
+
+    def _written_since(self, read_ts: int, scanned) -> bool:
+        """
+        did anything committed after read_ts write a key in the scanned range.
+        history is in commit order so walk it back from the newest
+        """
+
+        for ts, keys in reversed(self._history):
+            if ts <= read_ts:
+                return False
+            if any(key in scanned for key in keys):
+                return True
+
+        return False
@@ -0,0 +1,184 @@
+from __future__ import annotations
+from typing import Generator, List, Optional
+from random import getrandbits
+from sys import getsizeof
+from jdb import types
+
+MAX_HEIGHT = 16
+_BRANCHING_BITS = 2
+_BRANCHING_MASK = (1 << _BRANCHING_BITS) - 1
+
+
+class Node:
+    """skiplist node. next[i] is the successor at level i"""
+
+    __slots__ = ("key", "next", "prev")
+
+    def __init__(self, key: Optional[types.IndexEntry], height: int):
+        self.key = key
+        self.next: List[Optional[Node]] = [None] * height
+        self.prev: Optional[Node] = None
+
+
+_NODE_BYTES = getsizeof(Node(key=None, height=0))
+
+
+class SkipList:
+    """
+    skiplist index (see memsql/pugh in the readme). one writer, any number of
+    readers, no locks on the read side. a new node is fully built before anything
+    points at it and is then linked in bottom up, each link being a single
+    reference store - so a reader sees it at every level or at the levels below
+    whatever has been linked so far, never a half built node. prev pointers only
+    exist on the bottom level, for reverse iteration
+    """
+
+    def __init__(self):
+        self._head = Node(key=None, height=MAX_HEIGHT)
+        self._tail = self._head
+        self._height = 1
+        self._len = 0
+        self.nbytes = 0
+
+    def __len__(self) -> int:
+        """number of keys"""
+
+        return self._len
+
+    def __iter__(self) -> Generator[types.IndexEntry, None, None]:
+        """ascending"""
+
+        node = self._head.next[0]
+
+        while node:
+            yield node.key
+            node = node.next[0]
+
+    def __reversed__(self) -> Generator[types.IndexEntry, None, None]:
+        """descending"""
+
+        node = self._tail
+
+        while node is not self._head:
+            yield node.key
+            node = node.prev
+
+    def seek(
+        self, key: Optional[types.IndexEntry], reverse: bool = False
+    ) -> Generator[types.IndexEntry, None, None]:
+        """
+        iterate from the first entry gte key, or if reverse, from the last entry
+        lte key towards the front. no key means from the start (or end)
+        """
+
+        if key is None:
+            yield from reversed(self) if reverse else self
+            return
+
+        node = self._find_less(key)
+
+        if reverse:
+            after = node.next[0]
+
+            if after and after.key[0] == key[0]:
+                node = after
+
+            while node is not self._head:
+                yield node.key
+                node = node.prev
+
+            return
+
+        node = node.next[0]
+
+        while node:
+            yield node.key
+            node = node.next[0]
+
+    def search(
+        self, key: types.IndexEntry, gte: Optional[bool] = False
+    ) -> Optional[types.IndexEntry]:
+        """exact match, or if gte is true, the closest entry gte the search key"""
+
+        node = self._find_less(key).next[0]
+
+        if node and (gte or node.key[0] == key[0]):
+            return node.key
+
+        return None
+
+    def insert(self, key: types.IndexEntry) -> None:
+        """add an entry, replacing the one with the same key if there is one"""
+
+        preds = self._preds(key)
+        found = preds[0].next[0]
+
+        if found and found.key[0] == key[0]:
+            found.key = key
+            return
+
+        height = self._random_height()
+        node = Node(key=key, height=height)
+
+        for level in range(0, height):
+            node.next[level] = preds[level].next[level]
+
+        node.prev = preds[0]
+
+        for level in range(0, height):
+            preds[level].next[level] = node
+
+        if node.next[0]:
+            node.next[0].prev = node
+        else:
+            self._tail = node
+
+        self._height = max(self._height, height)
+        self._len += 1
+        self.nbytes += (
+            _NODE_BYTES + getsizeof(node.next) + getsizeof(key) + getsizeof(key[0])
+        )
+
+    def _find_less(self, key: types.IndexEntry) -> Node:
+        """last node with a key less than the search key, or the head"""
+
+        node = self._head
+
+        for level in range(self._height - 1, -1, -1):
+            nxt = node.next[level]
+
+            while nxt and nxt.key[0] < key[0]:
+                node = nxt
+                nxt = node.next[level]
+
+        return node
+
+    def _preds(self, key: types.IndexEntry) -> List[Node]:
+        """per level, the last node with a key less than the search key"""
+
+        preds = [self._head] * MAX_HEIGHT
+        node = self._head
+
+        for level in range(self._height - 1, -1, -1):
+            nxt = node.next[level]
+
+            while nxt and nxt.key[0] < key[0]:
+                node = nxt
+                nxt = node.next[level]
+
+            preds[level] = node
+
+        return preds
+
+    @staticmethod
+    def _random_height() -> int:
+        """geometric, 1 in 4 chance of each extra level"""
+
+        height = 1
+        bits = getrandbits(_BRANCHING_BITS * MAX_HEIGHT)
+
+        while height < MAX_HEIGHT and not bits & _BRANCHING_MASK:
+            height += 1
+            bits >>= _BRANCHING_BITS
+
+        return height
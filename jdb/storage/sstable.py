@@ -0,0 +1,387 @@
+from __future__ import annotations
+from typing import Dict, Generator, List, Optional, Tuple
+from bisect import bisect_left
+import mmap
+import os
+import uvarint
+from jdb.storage import entry as ent, compression as cmp, bloom
+from jdb import errors as err, types, util
+
+MAGIC = 0x6A64627373743031
+FOOTER_SIZE = 32
+BLOCK_SIZE = 4 << 10
+INDEX = "index"
+PROPS = "props"
+FILTER = "filter"
+
+Handle = Tuple[int, int]
+
+
+def _encode_bytes(buf: bytes) -> bytes:
+    """length prefixed bytes"""
+
+    return uvarint.encode(len(buf)) + buf
+
+
+def _decode_bytes(buf: ent.Buffer, offset: int) -> Tuple[bytes, int]:
+    """inverse of _encode_bytes. returns value and offset after it"""
+
+    length, start = ent.read_uvarint(buf, offset)
+    return bytes(buf[start : start + length]), start + length
+
+
+def _decode_int(buf: ent.Buffer, offset: int) -> Tuple[int, int]:
+    """uvarint at offset. returns value and offset after it"""
+
+    return ent.read_uvarint(buf, offset)
+
+
+class SSTableWriter:
+    """
+    builds an immutable sorted table file. entries must be added in key order.
+    -------------------------------------------------------------
+    | data blocks | index | props | ... | metaindex | footer |
+    -------------------------------------------------------------
+    data blocks are back-to-back encoded entries, the same bytes the memtable
+    holds. the index has the last key of each block so a lookup touches one
+    block. the metaindex maps block names to (offset, size) so new block types
+    can be added without changing the footer. if bits_per_key is set, a bloom
+    filter over the user keys (no ts suffix) goes in the filter block
+    """
+
+    def __init__(self, path: str, block_size: int = BLOCK_SIZE, bits_per_key: int = 10):
+        self.path = path
+        self.block_size = block_size
+        self.bits_per_key = bits_per_key
+        self._tmp_path = f"{path}.tmp"
+        self._file = open(self._tmp_path, "wb")
+        self._offset = 0
+        self._block = bytearray()
+        self._block_last_key: Optional[types.Key] = None
+        self._index: List[Tuple[types.Key, Handle]] = []
+        self._smallest: Optional[types.Key] = None
+        self._largest: Optional[types.Key] = None
+        self._count = 0
+        self._min_ts = 0
+        self._max_ts = 0
+        self._hashes: List[int] = []
+        self._last_userkey: Optional[types.Key] = None
+
+    def add(self, key: types.Key, encoded: bytes) -> None:
+        """append an encoded entry"""
+
+        if self._largest is not None and key <= self._largest:
+            raise err.InvalidRequest("keys must be added in sorted order")
+
+        if self._smallest is None:
+            self._smallest = key
+
+        userkey, ts = util.decode_key_with_ts(key)
+
+        if self.bits_per_key and userkey != self._last_userkey:
+            self._hashes.append(bloom.BloomFilter.hash(userkey))
+            self._last_userkey = userkey
+
+        self._min_ts = ts if not self._count else min(self._min_ts, ts)
+        self._max_ts = max(self._max_ts, ts)
+        self._largest = key
+        self._count += 1
+        self._block += encoded
+        self._block_last_key = key
+
+        if len(self._block) >= self.block_size:
+            self._finish_block()
+
+    def finish(self) -> None:
+        """write index/meta blocks + footer and atomically move into place"""
+
+        self._finish_block()
+        blocks: Dict[str, bytes] = {
+            INDEX: self._encode_index(),
+            PROPS: self._encode_props(),
+        }
+
+        if self.bits_per_key:
+            blocks[FILTER] = bloom.BloomFilter.build(
+                self._hashes, self.bits_per_key
+            ).encode()
+
+        metaindex = bytearray()
+
+        for name, block in blocks.items():
+            offset = self._write(block)
+            metaindex += _encode_bytes(name.encode())
+            metaindex += uvarint.encode(offset) + uvarint.encode(len(block))
+
+        metaindex_offset = self._write(bytes(metaindex))
+        footer = b"".join(
+            val.to_bytes(8, byteorder="big")
+            for val in [metaindex_offset, len(metaindex), self._count, MAGIC]
+        )
+        self._write(footer)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        """throw away a partially written table"""
+
+        self._file.close()
+        os.remove(self._tmp_path)
+
+    def _finish_block(self) -> None:
+        """flush the current data block"""
+
+        if not self._block or self._block_last_key is None:
+            return
+
+        offset = self._write(bytes(self._block))
+        self._index.append((self._block_last_key, (offset, len(self._block))))
+        self._block = bytearray()
+        self._block_last_key = None
+
+    def _write(self, buf: bytes) -> int:
+        """write at end of file, return offset"""
+
+        offset = self._offset
+        self._file.write(buf)
+        self._offset += len(buf)
+        return offset
+
+    def _encode_index(self) -> bytes:
+        """last key + handle per data block"""
+
+        index = bytearray()
+
+        for key, (offset, size) in self._index:
+            index += _encode_bytes(key) + uvarint.encode(offset) + uvarint.encode(size)
+
+        return bytes(index)
+
+    def _encode_props(self) -> bytes:
+        """table level metadata"""
+
+        props = bytearray()
+        props += _encode_bytes(self._smallest or b"")
+        props += _encode_bytes(self._largest or b"")
+        props += uvarint.encode(self._count)
+        props += uvarint.encode(self._min_ts)
+        props += uvarint.encode(self._max_ts)
+        return bytes(props)
+
+
+class SSTable:
+    """
+    read-only handle on a table file. the file is mmapped and blocks are handed
+    out as memoryview slices of the mapping, so lookups decode straight out of
+    the page cache without read() copies
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: Optional[cmp.Compression] = None,
+        number: int = 0,
+    ):
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self.path = path
+        self.number = number
+        self.compression = compression
+        self.file_size = os.path.getsize(path)
+
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._mmap)
+        footer = self._read((self.file_size - FOOTER_SIZE, FOOTER_SIZE))
+        fields = [
+            int.from_bytes(footer[i : i + 8], byteorder="big")
+            for i in range(0, FOOTER_SIZE, 8)
+        ]
+        metaindex_offset, metaindex_size, self.count, magic = fields
+
+        if magic != MAGIC:
+            raise err.ChecksumMismatch(f"bad table magic {path}")
+
+        self.meta_handles = self._decode_metaindex(
+            self._read((metaindex_offset, metaindex_size))
+        )
+        self._block_keys: List[types.Key] = []
+        self._block_handles: List[Handle] = []
+        self._smallest = bytes()
+        self._largest = bytes()
+        self.min_ts = 0
+        self.max_ts = 0
+        self._decode_index(self._read(self.meta_handles[INDEX]))
+        self._decode_props(self._read(self.meta_handles[PROPS]))
+        self.filter: Optional[bloom.BloomFilter] = None
+
+        if FILTER in self.meta_handles:
+            self.filter = bloom.BloomFilter.decode(
+                self._read(self.meta_handles[FILTER])
+            )
+
+    @property
+    def smallest(self) -> types.Key:
+        """first key"""
+
+        return self._smallest
+
+    @property
+    def largest(self) -> types.Key:
+        """last key"""
+
+        return self._largest
+
+    def may_contain(self, userkey: types.Key) -> bool:
+        """false if the filter rules out any version of this user key"""
+
+        return not self.filter or self.filter.may_contain(userkey)
+
+    def get(self, key: types.Key) -> Optional[ent.EntryView]:
+        """first entry with a key gte the search key"""
+
+        i = bisect_left(self._block_keys, key)
+
+        if i == len(self._block_keys):
+            return None
+
+        block = self._read(self._block_handles[i])
+        offset = 0
+
+        while offset < len(block):
+            entry = ent.EntryView(block, offset, self.compression)
+
+            if entry.key >= key:
+                return entry
+
+            offset = entry.end
+
+        return None
+
+    def seek(
+        self, key: Optional[types.Key], reverse: bool = False
+    ) -> Generator[ent.EntryView, None, None]:
+        """
+        entries in key order from the first key gte key, or if reverse, descending
+        from the last key lte key. no key means from the start (or end)
+        """
+
+        handles = self._block_handles
+
+        if not reverse:
+            i = 0 if key is None else bisect_left(self._block_keys, key)
+
+            for handle in handles[i:]:
+                for entry, _ in self._block_entries(handle):
+                    if key is None or entry.key >= key:
+                        yield entry
+
+            return
+
+        i = len(handles) if key is None else bisect_left(self._block_keys, key) + 1
+
+        for handle in reversed(handles[:i]):
+            block = [entry for entry, _ in self._block_entries(handle)]
+
+            for entry in reversed(block):
+                if key is None or entry.key <= key:
+                    yield entry
+
+    def entries(self) -> Generator[Tuple[types.Key, ent.Buffer], None, None]:
+        """(key, encoded entry) in key order"""
+
+        for handle in self._block_handles:
+            for entry, buf in self._block_entries(handle):
+                yield entry.key, buf
+
+    def overlaps(self, smallest: types.Key, largest: types.Key) -> bool:
+        """does this table's key range intersect [smallest, largest]"""
+
+        return self._smallest <= largest and self._largest >= smallest
+
+    def close(self) -> None:
+        """
+        unmap the file. idempotent. if entries handed out by entries() are still
+        alive the mapping stays around until they are collected
+        """
+
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+
+            self._mmap = None
+
+    def __del__(self):
+        """
+        tables replaced by a compaction get unlinked right away but readers that
+        picked them up before the swap can keep using them until they let go
+        """
+
+        self.close()
+
+    def _block_entries(
+        self, handle: Handle
+    ) -> Generator[Tuple[ent.EntryView, ent.Buffer], None, None]:
+        """decode every entry in a data block"""
+
+        block = self._read(handle)
+        offset = 0
+
+        while offset < len(block):
+            entry = ent.EntryView(block, offset, self.compression)
+            yield entry, block[offset : entry.end]
+            offset = entry.end
+
+    def _read(self, handle: Handle) -> memoryview:
+        """zero-copy view of a block"""
+
+        offset, size = handle
+
+        if self._view is None:
+            raise err.InvalidRequest(f"table closed {self.path}")
+
+        return self._view[offset : offset + size]
+
+    def _decode_metaindex(self, buf: bytes) -> Dict[str, Handle]:
+        """name -> handle"""
+
+        handles = {}
+        offset = 0
+
+        while offset < len(buf):
+            name, offset = _decode_bytes(buf, offset)
+            block_offset, offset = _decode_int(buf, offset)
+            block_size, offset = _decode_int(buf, offset)
+            handles[name.decode()] = (block_offset, block_size)
+
+        return handles
+
+    def _decode_index(self, buf: bytes) -> None:
+        """last key + handle per block"""
+
+        offset = 0
+
+        while offset < len(buf):
+            key, offset = _decode_bytes(buf, offset)
+            block_offset, offset = _decode_int(buf, offset)
+            block_size, offset = _decode_int(buf, offset)
+            self._block_keys.append(key)
+            self._block_handles.append((block_offset, block_size))
+
+    def _decode_props(self, buf: bytes) -> None:
+        """table level metadata"""
+
+        self._smallest, offset = _decode_bytes(buf, 0)
+        self._largest, offset = _decode_bytes(buf, offset)
+        _, offset = _decode_int(buf, offset)
+        self.min_ts, offset = _decode_int(buf, offset)
+        self.max_ts, offset = _decode_int(buf, offset)
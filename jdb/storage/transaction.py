@@ -1,10 +1,11 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Optional, MutableSet, Dict
+from typing import Generator, List, Optional, MutableSet, Dict, Tuple
 from uuid import uuid4 as uuid
 from enum import Enum
+from heapq import merge
 from collections import OrderedDict
-from jdb import util, types as t, storage, errors as err
+from jdb import const, util, types as t, storage, errors as err
 
 
 class TransactionStatus(Enum):
@@ -16,6 +17,19 @@ class TransactionStatus(Enum):
     NOOP = 3
 
 
+@dataclass
+class KeyRange:
+    """[start, end) of user keys. no end means unbounded"""
+
+    start: t.Key
+    end: Optional[t.Key] = None
+
+    def __contains__(self, key: t.Key) -> bool:
+        """override"""
+
+        return self.start <= key and (self.end is None or key < self.end)
+
+
 @dataclass
 class TransactionMeta:
     """data only. TODO refactor"""
@@ -51,6 +65,7 @@ class Transaction:
     db: storage.DB
     writes: OrderedDict
     reads: MutableSet[t.Key]
+    scans: List[KeyRange]
     txnid: str
     read_ts: t.Timestamp
     commit_ts: Optional[t.Timestamp]
@@ -60,11 +75,14 @@ class Transaction:
         self.db = db
         self.writes = OrderedDict()
         self.reads = set()
+        self.scans = []
         self.returning: Dict[t.Key, Optional[t.Value]] = {}
         self.txnid = str(uuid())
-        self.read_ts = db.oracle.read_ts()
+        self.read_ts = db.oracle.begin()
         self.commit_ts = None
         self.status = TransactionStatus.PENDING
+        self._log_seq: Optional[int] = None
+        self._finished = False
 
     def read(self, key: t.Key) -> Optional[t.Value]:
         """
@@ -94,11 +112,115 @@ class Transaction:
         self.returning[key] = version.value
         return version.value
 
+    def scan(
+        self,
+        start: Optional[t.Key] = None,
+        end: Optional[t.Key] = None,
+        prefix: Optional[t.Key] = None,
+        reverse: bool = False,
+        limit: Optional[int] = None,
+    ) -> Generator[Tuple[t.Key, t.Value], None, None]:
+        """
+        lazily yield (key, value) for the newest version of each key in
+        [start, end) visible to this transaction, in key order or descending if
+        reverse, skipping deletes. this transaction's own writes are visible.
+        prefix narrows the range to keys starting with it. the range read is
+        tracked for conflict checks - if the caller stops early (or hits limit)
+        only the part actually covered is
+        """
+
+        keys = _range(start, end, prefix)
+        scanned = KeyRange(start=keys.start, end=keys.end)
+        self.scans.append(scanned)
+        count = 0
+        last: Optional[t.Key] = None
+        complete = False
+
+        try:
+            for key, value in self._scan(keys, reverse):
+                if limit is not None and count >= limit:
+                    break
+
+                count += 1
+                last = key
+                yield key, value
+            else:
+                complete = True
+        finally:
+            if not complete and last is not None:
+                if reverse:
+                    scanned.start = last
+                else:
+                    scanned.end = last + b"\x00"
+
     def write(self, key: t.Key, value: t.Value = bytes(), meta: int = 0):
         """add a pending write"""
 
         self.writes[key] = storage.Entry(key=key, value=value, meta=meta)
 
+    def _scan(
+        self, keys: KeyRange, reverse: bool
+    ) -> Generator[Tuple[t.Key, t.Value], None, None]:
+        """newest visible versions merged with pending writes, minus deletes"""
+
+        pending = sorted(
+            (key, 0, write) for key, write in self.writes.items() if key in keys
+        )
+        stored = ((key, 1, entry) for key, entry in self._versions(keys, reverse))
+        last: Optional[t.Key] = None
+
+        for key, _, entry in merge(
+            reversed(pending) if reverse else pending, stored, reverse=reverse
+        ):
+            if key == last:
+                continue
+
+            last = key
+
+            if not entry.isdeleted:
+                yield key, entry.value
+
+    def _versions(
+        self, keys: KeyRange, reverse: bool
+    ) -> Generator[Tuple[t.Key, storage.EntryView], None, None]:
+        """
+        (key, newest version as of read_ts) for each key in range. in reverse a
+        key's versions come oldest first, so hold on to the last visible one
+        until the key changes
+        """
+
+        lower = util.encode_key_with_ts(keys.start, const.MAX_UINT_64)
+        upper = None
+
+        if keys.end is not None:
+            upper = util.encode_key_with_ts(keys.end, const.MAX_UINT_64)
+
+        versions = self.db.read_range(lower, upper, reverse=reverse)
+        current: Optional[t.Key] = None
+        visible: Optional[storage.EntryView] = None
+        found = False
+
+        for version in versions:
+            key, ts = util.decode_key_with_ts(version.key)
+
+            if key != current:
+                if visible is not None:
+                    yield current, visible
+
+                current, visible, found = key, None, False
+
+            if ts > self.read_ts or found:
+                continue
+
+            if reverse:
+                visible = version
+            else:
+                found = True
+                yield key, version
+
+        if visible is not None:
+            yield current, visible
+
     def isreadonly(self) -> bool:
         """helper"""
 
@@ -108,15 +230,30 @@ class Transaction:
         """
         dont incur any overhead with oracle if no writes to process.
         else, get a commit ts from oracle and apply to all writes then ship
-        over to db to persist
+        over to db to persist. only the conflict check is serialized - encoding
+        and waiting for the log happen outside of any lock, so concurrent commits
+        overlap and can share an fsync
         """
 
         if not self.writes:
             self.status = TransactionStatus.NOOP
+            self.finish()
             return self
 
-        with self.db.oracle.write_lock:
-            return self._commit()
+        try:
+            self._commit()
+        finally:
+            self.finish()
+
+        self.db.sync(self._log_seq)
+        return self
+
+    def finish(self):
+        """stop pinning this transaction's snapshot. idempotent"""
+
+        if not self._finished:
+            self._finished = True
+            self.db.oracle.finish(self.read_ts)
 
     def _commit(self) -> Transaction:
         """we have writes, commit transaction"""
@@ -130,13 +267,47 @@ class Transaction:
         self.commit_ts = commit_ts
         writes = []
 
-        for key, write in self.writes.items():
-            key_with_ts = util.encode_key_with_ts(key=key, ts=commit_ts)
-            new_entry = storage.Entry(
-                key=key_with_ts, value=write.value, meta=write.meta
-            )
-            writes.append(new_entry)
+        try:
+            for key, write in self.writes.items():
+                key_with_ts = util.encode_key_with_ts(key=key, ts=commit_ts)
+                new_entry = storage.Entry(
+                    key=key_with_ts, value=write.value, meta=write.meta
+                )
+                writes.append(new_entry)
+
+            self._log_seq = self.db.write(writes, commit_ts=commit_ts)
+        finally:
+            self.db.oracle.applied.done(commit_ts)
 
-        self.db.write(writes)
         self.status = TransactionStatus.COMMITTED
         return self
+
+
+def _range(
+    start: Optional[t.Key], end: Optional[t.Key], prefix: Optional[t.Key]
+) -> KeyRange:
+    """intersect [start, end) with the keys starting with prefix"""
+
+    keys = KeyRange(start=start or bytes(), end=end)
+
+    if prefix is None:
+        return keys
+
+    keys.start = max(keys.start, prefix)
+    prefix_end = _prefix_end(prefix)
+
+    if prefix_end is not None and (keys.end is None or prefix_end < keys.end):
+        keys.end = prefix_end
+
+    return keys
+
+
+def _prefix_end(prefix: t.Key) -> Optional[t.Key]:
+    """smallest key greater than every key starting with prefix, if there is one"""
+
+    stripped = prefix.rstrip(b"\xff")
+
+    if not stripped:
+        return None
+
+    return stripped[:-1] + bytes([stripped[-1] + 1])
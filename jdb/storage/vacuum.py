@@ -0,0 +1,195 @@
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from time import monotonic
+from jdb.storage import entry as ent, memtable as mem
+from jdb import const, types, util
+
+if TYPE_CHECKING:
+    from jdb.storage.db import DB
+
+
+@dataclass
+class VacuumStats:
+    """counters for INFO"""
+
+    runs: int = 0
+    aborted: int = 0
+    versions_dropped: int = 0
+    bytes_reclaimed: int = 0
+    max_pause_ms: float = 0
+
+
+class Vacuum:
+    """
+    mvcc garbage collection for the active memtable. every commit appends a new
+    version, so an update heavy key grows the arena with every write. this
+    rebuilds the memtable into a fresh arena keeping, per key, every version
+    newer than the oldest live snapshot plus the newest one at or below it
+    (dropped too if it's a tombstone with nothing older on disk), then swaps it
+    in. the copy happens batch_size index entries at a time, each batch under
+    the write lock, so commits only ever wait on one batch. whatever gets
+    appended while it runs is copied as is at the end - most of it without the
+    lock, since the arena never changes behind the write offset
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        interval_ms: Optional[int] = 1000,
+        batch_size: int = 1024,
+        min_bytes: int = 1 << 20,
+    ):
+        self.db = db
+        self.interval_ms = interval_ms
+        self.batch_size = batch_size
+        self.min_bytes = min_bytes
+        self.stats = VacuumStats()
+        self._lock = Lock()
+        self._memtable: Optional[mem.Memtable] = None
+        self._live_bytes = 0
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+
+        if interval_ms:
+            self._thread = Thread(target=self._loop, daemon=True, name="DBVacuum")
+            self._thread.start()
+
+    def due(self) -> bool:
+        """
+        has the active memtable at least doubled (and grown by min_bytes) since it
+        was last collected. keeps the copying amortized to O(1) per byte written
+        """
+
+        memtable = self.db.memtable
+        live = self._live_bytes if memtable is self._memtable else 0
+        return memtable.size() - live >= max(self.min_bytes, live)
+
+    def collect(self) -> int:
+        """rebuild the active memtable without dead versions. returns bytes reclaimed"""
+
+        with self._lock:
+            return self._collect()
+
+    def stop(self) -> None:
+        """stop the background thread"""
+
+        self._stopped.set()
+
+        if self._thread:
+            self._thread.join()
+
+    def _loop(self) -> None:
+        """collect whenever it's due"""
+
+        while not self._stopped.wait((self.interval_ms or 0) / 1000):
+            if self.due():
+                self.collect()
+
+    def _collect(self) -> int:
+        """see class docstring. gives up if the memtable gets frozen meanwhile"""
+
+        db = self.db
+        lock = db.oracle.write_lock
+
+        with lock:
+            source = db.memtable
+            copied_until = source.size()
+
+        target = db.new_memtable()
+        target.log_segment = source.log_segment
+        watermark = db.oracle.oldest_read_ts()
+        after: Optional[types.Key] = None
+        last_userkey: Optional[types.Key] = None
+        shadowed = False
+        dropped = 0
+
+        while True:
+            with lock:
+                started = monotonic()
+
+                if db.memtable is not source:
+                    self.stats.aborted += 1
+                    return 0
+
+                batch = source.index_entries(after, self.batch_size)
+
+                for key, offset in batch:
+                    if offset >= copied_until:
+                        continue
+
+                    userkey, ts = util.decode_key_with_ts(key)
+
+                    if userkey != last_userkey:
+                        last_userkey = userkey
+                        shadowed = False
+
+                    encoded = source.encoded_at(offset)
+
+                    if ts <= watermark:
+                        dead = shadowed or self._is_dead(userkey, encoded)
+                        shadowed = True
+
+                        if dead:
+                            dropped += 1
+                            continue
+
+                    target.put_encoded(key, encoded)
+
+                self._pause(started)
+
+            if len(batch) < self.batch_size:
+                break
+
+            after = batch[-1][0]
+
+        caught_up = source.size()
+
+        for key, encoded in source.tail(copied_until, caught_up):
+            target.put_encoded(key, encoded)
+
+        with lock:
+            started = monotonic()
+
+            if db.memtable is not source:
+                self.stats.aborted += 1
+                return 0
+
+            for key, encoded in source.tail(caught_up):
+                target.put_encoded(key, encoded)
+
+            db.memtable = target
+            self._pause(started)
+
+        reclaimed = source.size() - target.size()
+        self._memtable = target
+        self._live_bytes = target.size()
+        self.stats.runs += 1
+        self.stats.versions_dropped += dropped
+        self.stats.bytes_reclaimed += reclaimed
+        return reclaimed
+
+    def _is_dead(self, userkey: types.Key, encoded: ent.Buffer) -> bool:
+        """
+        a tombstone nobody can see past, with no older version left on disk or
+        in a frozen memtable for it to hide
+        """
+
+        entry = ent.EntryView(encoded, compression=self.db.compression)
+
+        if not entry.isdeleted or self.db.immutables:
+            return False
+
+        smallest = util.encode_key_with_ts(userkey, const.MAX_UINT_64)
+        largest = util.encode_key_with_ts(userkey, 0)
+        return not any(
+            table.overlaps(smallest, largest) and table.may_contain(userkey)
+            for table in self.db.tables
+        )
+
+    def _pause(self, started: float) -> None:
+        """track the longest time writers were held up"""
+
+        pause_ms = (monotonic() - started) * 1000
+        self.stats.max_pause_ms = max(self.stats.max_pause_ms, round(pause_ms, 3))
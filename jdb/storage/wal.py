@@ -0,0 +1,244 @@
+from typing import Generator, List, Optional
+from enum import Enum
+from binascii import crc32
+from threading import Condition, Event, Thread
+import os
+import uvarint
+
+_CRC_SIZE = 4
+_SUFFIX = ".log"
+
+
+class SyncMode(Enum):
+    """when the log gets fsynced"""
+
+    ALWAYS = 0
+    INTERVAL = 1
+    NONE = 2
+
+
+class WAL:
+    """
+    append-only write-ahead log. each record is the encoded entries of one commit.
+    committers append under the commit lock (cheap, in memory) and then wait for
+    durability outside of it. whoever gets to the log first becomes the leader and
+    writes + fsyncs everything that has been appended so far in one shot, so
+    concurrent committers share a single fsync (group commit).
+    the log is split into numbered segments, one per memtable, so a segment can
+    be deleted once its memtable has been flushed to a table
+    -------------------------------------
+    | payload length | payload | crc32 |
+    -------------------------------------
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sync_mode: SyncMode = SyncMode.ALWAYS,
+        sync_interval_ms: int = 100,
+    ):
+        self.directory = directory
+        self.sync_mode = sync_mode
+        self.sync_interval_ms = sync_interval_ms
+        self._cond = Condition()
+        self._buffer: List[bytes] = []
+        self._appended = 0
+        self._durable = 0
+        self._flushing = False
+        self._syncs = 0
+        self._records = 0
+        self._bytes = 0
+        segments = self.segments()
+        self.segment = segments[-1] if segments else 1
+
+        for segment in segments:
+            self._recover(segment)
+
+        self._file = open(self._path(self.segment), "ab")
+        self._stopped = Event()
+        self._syncer: Optional[Thread] = None
+
+        if sync_mode == SyncMode.INTERVAL:
+            self._syncer = Thread(target=self._sync_loop, daemon=True, name="WALSync")
+            self._syncer.start()
+
+    def append(self, payload: bytes) -> int:
+        """buffer a record, return its sequence number. threadsafe"""
+
+        record = uvarint.encode(len(payload)) + payload
+        record += crc32(payload).to_bytes(_CRC_SIZE, byteorder="big")
+
+        with self._cond:
+            self._buffer.append(record)
+            self._appended += 1
+            self._records += 1
+            self._bytes += len(record)
+            return self._appended
+
+    def sync(self, seq: int) -> None:
+        """
+        block until the record with this sequence number has been persisted
+        according to the sync mode. in interval mode the background thread owns
+        syncing so just return
+        """
+
+        if self.sync_mode == SyncMode.INTERVAL:
+            return
+
+        with self._cond:
+            while self._durable < seq:
+                if self._flushing:
+                    self._cond.wait()
+                else:
+                    self._flush()
+
+    def segments(self) -> List[int]:
+        """segment numbers on disk, oldest first"""
+
+        return sorted(
+            int(name[: -len(_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(_SUFFIX)
+        )
+
+    def rotate(self) -> int:
+        """
+        write out everything buffered to the current segment and start a new one.
+        caller must make sure nothing is appended concurrently
+        """
+
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+
+            self._flush()
+            self._file.close()
+            self.segment += 1
+            self._file = open(self._path(self.segment), "ab")
+            return self.segment
+
+    def remove(self, segment: int) -> None:
+        """delete a segment whose contents are persisted elsewhere"""
+
+        os.remove(self._path(segment))
+
+    def replay(self, segment: int) -> Generator[bytes, None, None]:
+        """yield the payload of every intact record in a segment"""
+
+        with open(self._path(segment), "rb") as file:
+            buf = file.read()
+
+        for payload, _ in self._records_in(buf):
+            yield payload
+
+    def close(self) -> None:
+        """flush whatever is pending and close the file"""
+
+        self._stopped.set()
+
+        if self._syncer:
+            self._syncer.join()
+
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+
+            self._flush()
+
+        self._file.close()
+
+    def stats(self) -> dict:
+        """counters"""
+
+        return {
+            "records": self._records,
+            "bytes": self._bytes,
+            "syncs": self._syncs,
+            "sync_mode": self.sync_mode.name,
+            "segment": self.segment,
+        }
+
+    def _flush(self) -> None:
+        """
+        called with the condition held. become the leader for everything buffered
+        so far: release the lock while doing io so other committers can keep
+        appending, then wake up everyone that was waiting on this batch
+        """
+
+        self._flushing = True
+        batch, self._buffer = self._buffer, []
+        seq = self._appended
+        self._cond.release()
+
+        try:
+            if batch:
+                self._file.write(b"".join(batch))
+                self._file.flush()
+
+                if self.sync_mode != SyncMode.NONE:
+                    os.fsync(self._file.fileno())
+        finally:
+            self._cond.acquire()
+            self._flushing = False
+
+            if batch:
+                self._syncs += 1
+
+            self._durable = max(self._durable, seq)
+            self._cond.notify_all()
+
+    def _sync_loop(self) -> None:
+        """interval mode - flush + fsync every n ms"""
+
+        while not self._stopped.wait(self.sync_interval_ms / 1000):
+            with self._cond:
+                if not self._flushing:
+                    self._flush()
+
+    def _path(self, segment: int) -> str:
+        """segment file path"""
+
+        return os.path.join(self.directory, f"{segment:06d}{_SUFFIX}")
+
+    def _recover(self, segment: int) -> None:
+        """truncate a torn tail left over from a crash mid-write"""
+
+        path = self._path(segment)
+
+        with open(path, "rb") as file:
+            buf = file.read()
+
+        end = 0
+
+        for _, end in self._records_in(buf):
+            pass
+
+        if end < len(buf):
+            os.truncate(path, end)
+
+    @classmethod
+    def _records_in(cls, buf: bytes) -> Generator:
+        """yield (payload, end offset) for each intact record"""
+
+        offset = 0
+
+        while offset < len(buf):
+            try:
+                length, header_size = uvarint.decode(buf[offset : offset + 9])
+            except (ValueError, OverflowError):
+                return
+
+            start = offset + header_size
+            end = start + length + _CRC_SIZE
+
+            if end > len(buf):
+                return
+
+            payload = buf[start : start + length]
+            checksum = int.from_bytes(buf[start + length : end], byteorder="big")
+
+            if crc32(payload) != checksum:
+                return
+
+            yield payload, end
+            offset = end
@@ -4,18 +4,24 @@ from collections import OrderedDict
 from jdb.types import Key, Timestamp
 from jdb.const import MAX_UINT_64
 
+_SEPARATOR = b"\x00"
+
 
 def encode_key_with_ts(key: Key, ts: Timestamp) -> Key:
-    """append ts as last 8 bytes of key"""
+    """
+    append ts as last 8 bytes of key, after a zero byte. the separator makes a
+    key sort before the keys it is a prefix of (unless the longer key carries on
+    with a zero byte), so encoded keys are in key order, newest version first
+    """
 
     encoded_ts = (MAX_UINT_64 - ts).to_bytes(8, byteorder="big")
-    return key + encoded_ts
+    return key + _SEPARATOR + encoded_ts
 
 
 def decode_key_with_ts(key_with_ts: Key) -> Tuple[Key, Timestamp]:
     """parse out ts"""
 
-    key = key_with_ts[:-8]
+    key = key_with_ts[:-9]
     ts = MAX_UINT_64 - int.from_bytes(key_with_ts[-8:], byteorder="big")
     return (key, ts)
 
@@ -1,5 +1,6 @@
 # pylint:disable=redefined-outer-name
 
+from threading import Thread
 from pytest import fixture, mark, raises
 from freezegun import freeze_time
 import jdb.storage as db
@@ -8,10 +9,12 @@ import jdb.jql as jql
 import jdb.util as util
 import jdb.node as nde
 import jdb.hlc as hlc
+import jdb.const as const
 import jdb.crdt as crdt
 import jdb.routing as rte
 import jdb.membership as mbr
 import jdb.maglev as mag
+from jdb.storage import wal, memtable as mem, compression as cmp, oracle as orc
 
 
 @fixture
@@ -115,6 +118,401 @@ def test_ssi():
     assert txn3.commit_ts == 3
 
 
+def test_wal_replay(tmp_path):
+    database = db.DB(data_dir=str(tmp_path))
+    database.put(b"a", b"hello")
+    database.put(b"b", b"world")
+    database.delete(b"a")
+    database.close()
+
+    with open(tmp_path / "000001.log", "ab") as file:
+        file.write(b"\x10torn")
+
+    reopened = db.DB(data_dir=str(tmp_path))
+
+    assert not reopened.get(b"a")
+    assert reopened.get(b"b") == b"world"
+    assert db.Transaction(reopened).read_ts == 3
+
+    reopened.put(b"c", b"!")
+    reopened.close()
+
+    assert db.DB(data_dir=str(tmp_path)).get(b"c") == b"!"
+
+
+@mark.parametrize("sync_mode", list(wal.SyncMode))
+def test_wal_group_commit(tmp_path, sync_mode):
+    database = db.DB(data_dir=str(tmp_path), sync_mode=sync_mode)
+
+    def writer(i: int):
+        for j in range(0, 50):
+            database.put(f"{i}-{j}".encode(), b"v")
+
+    threads = [Thread(target=writer, args=(i,)) for i in range(0, 8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    database.close()
+    stats = database.stats()["wal"]
+
+    assert stats["records"] == 400
+    assert stats["syncs"] <= 400
+    assert db.DB(data_dir=str(tmp_path)).get(b"7-49") == b"v"
+
+
+def test_flush(tmp_path):
+    database = db.DB(data_dir=str(tmp_path), max_table_size=1024, compression=None)
+
+    for i in range(0, 200):
+        database.put(f"key{i}".encode(), f"val{i}".encode())
+
+    database.put(b"key0", b"new")
+    database.delete(b"key1")
+    database.flush()
+
+    assert database.tables
+    assert not database.immutables
+    assert database.get(b"key0") == b"new"
+    assert not database.get(b"key1")
+    assert database.get(b"key199") == b"val199"
+    assert not database.get(b"key200")
+
+    database.close()
+    reopened = db.DB(data_dir=str(tmp_path), max_table_size=1024, compression=None)
+
+    assert reopened.get(b"key0") == b"new"
+    assert not reopened.get(b"key1")
+    assert reopened.get(b"key150") == b"val150"
+
+
+def test_compaction(tmp_path):
+    database = db.DB(
+        data_dir=str(tmp_path),
+        compression=None,
+        l0_compaction_trigger=2,
+        compaction_rate_limit=None,
+    )
+
+    for i in range(0, 100):
+        database.put(f"key{i:02d}".encode(), b"old")
+
+    snapshot = db.Transaction(database)
+    database.flush()
+
+    for i in range(0, 100):
+        database.put(f"key{i:02d}".encode(), b"new")
+
+    for i in range(0, 100, 2):
+        database.delete(f"key{i:02d}".encode())
+
+    database.flush()
+    database.compactor.wait()
+
+    assert not database.levels[0]
+    assert sum(table.count for table in database.tables) == 250
+    assert snapshot.read(b"key10") == b"old"
+
+    snapshot.commit()
+
+    for i in range(0, 100, 10):
+        database.put(f"key{i:02d}".encode(), b"newer")
+
+    database.flush()
+    database.put(b"key99", b"newer")
+    database.flush()
+    database.compactor.wait()
+    stats = database.stats()["levels"]
+
+    assert stats[1]["compactions"] == 2
+    assert stats[1]["write_amp"] > 0
+    assert sum(table.count for table in database.tables) == 60
+    assert database.get(b"key10") == b"newer"
+    assert database.get(b"key11") == b"new"
+    assert not database.get(b"key12")
+
+    database.close()
+    reopened = db.DB(data_dir=str(tmp_path), compression=None)
+
+    assert reopened.get(b"key99") == b"newer"
+    assert not reopened.get(b"key98")
+
+
+@mark.parametrize("index", list(mem.IndexType))
+def test_scan(tmp_path, index):
+    database = db.DB(
+        data_dir=str(tmp_path),
+        compression=None,
+        l0_compaction_trigger=2,
+        compaction_rate_limit=None,
+        index=index,
+    )
+
+    for i in range(0, 30):
+        database.put(f"/a/{i}".encode(), b"old")
+
+    database.flush()
+    database.compactor.wait()
+    snapshot = db.Transaction(database)
+
+    for i in range(0, 30, 3):
+        database.put(f"/a/{i}".encode(), b"new")
+
+    database.delete(b"/a/1")
+    database.flush()
+    database.compactor.wait()
+    database.put(b"/a/2", b"newer")
+    database.put(b"/b/1", b"other")
+    keys = sorted(f"/a/{i}".encode() for i in range(0, 30) if i != 1)
+
+    assert database.levels[1]
+    assert [k for k, _ in database.scan(prefix=b"/a/")] == keys
+    assert [k for k, _ in database.scan(prefix=b"/a/", reverse=True)] == keys[::-1]
+    assert list(database.scan(start=b"/a/2", end=b"/a/21")) == [
+        (b"/a/2", b"newer"),
+        (b"/a/20", b"old"),
+    ]
+    assert list(database.scan(end=b"/a/9", limit=3, reverse=True)) == [
+        (b"/a/8", b"old"),
+        (b"/a/7", b"old"),
+        (b"/a/6", b"new"),
+    ]
+    assert list(database.scan(start=b"/a/9")) == [
+        (b"/a/9", b"new"),
+        (b"/b/1", b"other"),
+    ]
+    assert dict(snapshot.scan(prefix=b"/a/"))[b"/a/1"] == b"old"
+    assert dict(snapshot.scan(prefix=b"/a/"))[b"/a/2"] == b"old"
+
+    snapshot.write(b"/a/1", meta=const.BIT_TOMBSTONE)
+    snapshot.write(b"/a/100", b"mine")
+
+    assert list(snapshot.scan(start=b"/a/0", end=b"/a/11")) == [
+        (b"/a/0", b"old"),
+        (b"/a/10", b"old"),
+        (b"/a/100", b"mine"),
+    ]
+
+
+def test_oracle_prune():
+    database = db.DB()
+    snapshot = db.Transaction(database)
+    snapshot.read(b"key0")
+
+    for i in range(0, 100):
+        database.put(f"key{i}".encode(), b"v")
+
+    assert database.oracle.stats()["conflict_keys"] == 100
+
+    snapshot.write(b"other", b"v")
+
+    with raises(err.Abort):
+        snapshot.commit()
+
+    for i in range(0, 100):
+        database.put(b"key0", b"v")
+
+    stats = database.oracle.stats()
+
+    assert stats["conflict_keys"] <= 2
+    assert stats["pruned"] >= 99
+    assert stats["pending"] == 0
+
+
+def test_watermark():
+    mark = orc.Watermark()
+
+    for ts in (1, 2, 3):
+        mark.begin(ts)
+
+    mark.done(2)
+    assert mark.done_until == 0
+    mark.done(1)
+    assert mark.done_until == 2
+    waiter = Thread(target=mark.wait_for, args=(3,))
+    waiter.start()
+    mark.done(3)
+    waiter.join()
+    assert mark.done_until == 3
+
+
+def test_concurrent_commits():
+    database = db.DB()
+    first = db.Transaction(database)
+    first.write(b"a", b"1")
+    database.oracle.commit_request(first)
+    second = Thread(target=database.put, args=(b"b", b"2"))
+    second.start()
+    second.join(0.05)
+
+    assert second.is_alive()
+    assert database.oracle.stats()["applying"] == 2
+
+    reader = Thread(target=db.Transaction, args=(database,))
+    reader.start()
+    reader.join(0.05)
+
+    assert reader.is_alive()
+
+    database.oracle.applied.done(1)
+    second.join()
+    reader.join()
+
+    assert database.get(b"b") == b"2"
+
+    def writer(i: int):
+        for j in range(0, 50):
+            database.put(f"{i}/{j}".encode(), b"v")
+
+    threads = [Thread(target=writer, args=(i,)) for i in range(0, 8)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert database.oracle.stats()["applying"] == 0
+    assert len(list(database.scan(prefix=b"3/"))) == 50
+
+
+def test_scan_conflict():
+    database = db.DB()
+    database.put(b"/a/1", b"1")
+    database.put(b"/a/3", b"3")
+    scanner = db.Transaction(database)
+    limited = db.Transaction(database)
+
+    assert len(list(scanner.scan(prefix=b"/a/"))) == 2
+    assert list(limited.scan(prefix=b"/a/", limit=1)) == [(b"/a/1", b"1")]
+
+    database.put(b"/a/2", b"2")
+    scanner.write(b"/x", b"1")
+    limited.write(b"/y", b"1")
+    limited.commit()
+
+    with raises(err.Abort):
+        scanner.commit()
+
+
+def test_vacuum():
+    database = db.DB(compression=None, vacuum_interval_ms=None, vacuum_batch_size=16)
+
+    for i in range(0, 10):
+        for j in range(0, 50):
+            database.put(f"key{j}".encode(), f"v{i}".encode())
+
+    snapshot = db.Transaction(database)
+
+    for j in range(0, 50):
+        database.put(f"key{j}".encode(), b"latest")
+
+    for j in range(0, 50, 5):
+        database.delete(f"key{j}".encode())
+
+    before = database.memtable.size()
+    reclaimed = database.vacuum.collect()
+
+    assert reclaimed > 0
+    assert database.memtable.size() == before - reclaimed
+    assert database.memtable.entries_count() == 50 + 50 + 10
+    assert snapshot.read(b"key0") == b"v9"
+    assert database.get(b"key1") == b"latest"
+    assert database.get(b"key0") is None
+
+    snapshot.commit()
+    database.vacuum.collect()
+    stats = database.stats()["vacuum"]
+
+    assert database.memtable.entries_count() == 40
+    assert database.get(b"key1") == b"latest"
+    assert database.get(b"key5") is None
+    assert stats["runs"] == 2
+    assert stats["versions_dropped"] == 560 - 40
+    assert stats["bytes_reclaimed"] == before - database.memtable.size()
+
+
+def test_sstable(tmp_path):
+    path = str(tmp_path / "1.sst")
+    writer = db.SSTableWriter(path, block_size=64)
+    keys = [util.encode_key_with_ts(f"k{i:03d}".encode(), 1) for i in range(0, 100)]
+
+    for key in keys:
+        writer.add(key, db.Entry(key=key, value=key).encode())
+
+    writer.finish()
+    table = db.SSTable(path)
+
+    assert table.count == 100
+    assert table.smallest == keys[0]
+    assert table.largest == keys[-1]
+    assert table.get(keys[50]).value == keys[50]
+    assert table.get(b"k050").key == keys[50]
+    assert not table.get(b"k999")
+    assert [key for key, _ in table.entries()] == keys
+    assert all(isinstance(buf, memoryview) for _, buf in table.entries())
+
+    table.close()
+
+    with raises(err.InvalidRequest):
+        table.get(keys[0])
+
+
+@mark.parametrize("offset", [0, 3])
+def test_decode_at(offset):
+    entry = db.Entry(key=b"k" * 200, value=b"v" * 300, meta=1)
+    buf = bytearray(offset) + entry.encode() + db.Entry(key=b"next").encode()
+    decoded, end = db.Entry.decode_at(memoryview(buf), offset)
+
+    assert decoded == entry
+    assert db.Entry.decode_at(buf, end)[0].key == b"next"
+
+    buf[offset + 10] ^= 0xFF
+
+    with raises(err.ChecksumMismatch):
+        db.Entry.decode_at(buf, offset)
+
+
+def test_memtable_zero_copy():
+    table = mem.Memtable(max_size=1 << 20, compression=cmp.Compression(None))
+    table.put(db.Entry(key=b"a", value=b"1"))
+    table.put(db.Entry(key=b"b", value=b"2", meta=const.BIT_TOMBSTONE))
+    found = table.get(b"a")
+
+    assert isinstance(found, db.EntryView)
+    assert (found.key, found.value) == (b"a", b"1")
+    assert [(e.key, e.isdeleted) for e in table.scan()] == [
+        (b"a", False),
+        (b"b", True),
+    ]
+
+
+def test_bloom():
+    keys = [f"key{i}".encode() for i in range(0, 1000)]
+    bloom = db.BloomFilter.build([db.BloomFilter.hash(key) for key in keys], 10)
+    decoded = db.BloomFilter.decode(bloom.encode())
+    false_positives = sum(
+        decoded.may_contain(f"other{i}".encode()) for i in range(0, 1000)
+    )
+
+    assert all(decoded.may_contain(key) for key in keys)
+    assert false_positives < 50
+
+
+def test_bloom_skips(tmp_path):
+    database = db.DB(data_dir=str(tmp_path), l0_compaction_trigger=100)
+
+    for i in range(0, 4):
+        database.put(f"key{i}".encode(), b"val")
+        database.flush()
+
+    assert database.get(b"key0") == b"val"
+    assert not database.get(b"missing")
+    assert database.stats()["filter_skips"] >= 7
+
+
 def test_avl(tree: db.AVLTree):
     tree.insert((bytes([10]), 0))
     tree.insert((bytes([20]), 0))
@@ -163,6 +561,96 @@ def test_avl_near_3(tree: db.AVLTree):
     assert tree.search((bytes([3]), 0), gte=True) == (bytes([3]), 0)
 
 
+def test_skiplist():
+    skiplist = db.SkipList()
+    keys = [(bytes([i]), i) for i in range(0, 200, 2)]
+
+    for key in reversed(keys):
+        skiplist.insert(key)
+
+    skiplist.insert((bytes([10]), 99))
+
+    assert len(skiplist) == 100
+    assert list(skiplist)[5] == (bytes([10]), 99)
+    assert [k for k, _ in reversed(skiplist)] == [k for k, _ in reversed(keys)]
+    assert skiplist.search((bytes([11]), 0)) is None
+    assert skiplist.search((bytes([11]), 0), gte=True) == (bytes([12]), 12)
+    assert skiplist.search((bytes([255]), 0), gte=True) is None
+    assert next(skiplist.seek((bytes([11]), 0), reverse=True)) == (bytes([10]), 99)
+    assert next(skiplist.seek((bytes([12]), 0), reverse=True)) == (bytes([12]), 12)
+    assert [k for k, _ in skiplist.seek((bytes([195]), 0))] == [
+        bytes([196]),
+        bytes([198]),
+    ]
+
+
+def test_skiplist_concurrent_reads():
+    skiplist = db.SkipList()
+    errors = []
+
+    def _read():
+        for _ in range(0, 50):
+            keys = list(skiplist)
+
+            if keys != sorted(keys):
+                errors.append(keys)
+
+    readers = [Thread(target=_read) for _ in range(0, 4)]
+
+    for reader in readers:
+        reader.start()
+
+    for i in range(0, 5000):
+        skiplist.insert((i.to_bytes(4, "little"), i))
+
+    for reader in readers:
+        reader.join()
+
+    assert not errors
+    assert len(list(skiplist)) == 5000
+
+
+def test_skiplist_index():
+    database = db.DB(index=mem.IndexType.SKIPLIST)
+    database.put(b"a", b"1")
+    database.put(b"a", b"2")
+    database.put(b"b", b"3")
+    database.delete(b"b")
+
+    assert database.get(b"a") == b"2"
+    assert database.get(b"b") is None
+    assert database.stats()["memtable"]["index"] == "SKIPLIST"
+
+
+def test_array_index():
+    table = mem.Memtable(
+        max_size=1 << 24, compression=cmp.Compression(None), index=mem.IndexType.ARRAY
+    )
+    keys = [i.to_bytes(4, "big") for i in range(0, 20000, 2)]
+
+    for key in reversed(keys):
+        table.put(db.Entry(key=key, value=b"old"))
+
+    table.put(db.Entry(key=keys[3], value=b"new"))
+
+    assert [key for key, _ in table.entries()] == keys
+    assert table.get(keys[3]).value == b"new"
+    assert table.get(keys[4]).value == b"old"
+    assert table.get((7).to_bytes(4, "big")).key == (8).to_bytes(4, "big")
+    assert table.get((20000).to_bytes(4, "big")) is None
+    assert table.index_size() / len(keys) < 40
+
+
+def test_index_stats():
+    for index in mem.IndexType:
+        database = db.DB(index=index)
+        database.put(b"a", b"1")
+        stats = database.stats()["memtable"]
+
+        assert database.get(b"a") == b"1"
+        assert stats["index_bytes_per_key"] > 0
+
+
 @mark.skip
 def test_parse_put():
     parser = jql.JQL(node=nde.Node())